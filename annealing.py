@@ -0,0 +1,93 @@
+from functools import partial
+import numpy as np
+from biscuits_racel import RollLayout, biscuit_types, code_sizes, code_values, as_defects_index
+from bogo import random_layouts, score_layouts
+
+
+# Simulated annealing of a population of chains, all advanced together with array operations
+# The state of a chain is the code of the biscuit that starts at each position of the roll (-1 if none),
+# in one row of a 2D array, so a move only touches the few positions around it:
+# a move puts a biscuit valid at a random position (or an empty unit, which removes the biscuit there),
+# and removes the biscuits it overlaps. All the chains propose a move at each step,
+# and the moves are accepted together by a Metropolis test at the temperature of the step,
+# which decreases geometrically from t_start to t_end. Every state is a valid roll, so its price is its value.
+# The chains start from random valid rolls (see bogo.random_layouts), and the best roll seen by any chain is returned
+# control is an optional search_control.SearchControl, checked after each step. The temperatures still follow
+# the schedule of n_steps, so a search stopped early has not cooled down
+def annealing(n_steps=10000, n_chains=256, roll_size=500, t_start=2.0, t_end=0.02, seed=None, defects=None,
+              control=None):
+    rng = np.random.default_rng(seed)
+    if control is not None:
+        control.start()
+    defects = as_defects_index(defects)
+    mask = defects.feasibility_mask(roll_size)
+    n_types = len(biscuit_types)
+
+    # the moves are drawn among the codes valid at their position: allowed[position, :n_allowed[position]]
+    allowed = np.full((roll_size, n_types + 1), -1, dtype=np.int16)
+    n_allowed = np.ones(roll_size, dtype=np.int64)
+    for code in range(n_types):
+        positions = np.flatnonzero(mask[code])
+        allowed[positions, n_allowed[positions]] = code
+        n_allowed[positions] += 1
+
+    # a move at position can only overlap the biscuits that start less than max_size units away from it,
+    # the rows are padded with max_size empty units on each side so the window never leaves them
+    max_size = int(code_sizes[:n_types].max())
+    offsets = np.arange(-(max_size - 1), max_size)
+    center = max_size - 1
+    states = np.full((n_chains, roll_size + 2 * max_size), -1, dtype=np.int16)
+    codes, _ = random_layouts(n_chains, roll_size, rng, defects)
+    starts = np.cumsum(code_sizes[codes], axis=1) - code_sizes[codes]
+    chains, slots = np.nonzero(codes >= 0)
+    states[chains, max_size + starts[chains, slots]] = codes[chains, slots]
+    values = score_layouts(codes)
+
+    best_states = states.copy()
+    best_values = values.copy()
+    chains = np.arange(n_chains)
+    temperatures = t_start * (t_end / t_start) ** np.linspace(0, 1, n_steps)
+    for temperature in temperatures:
+        position = rng.integers(0, roll_size, size=n_chains)
+        code = allowed[position, (rng.random(n_chains) * n_allowed[position]).astype(np.int64)]
+        columns = max_size + position[:, None] + offsets
+        window = states[chains[:, None], columns]
+        # the biscuits of the window that overlap the new one, which covers [position, position + size)
+        # an empty unit covers its position, so it removes the biscuit over it
+        window_starts = position[:, None] + offsets
+        overlaps = (window >= 0) & (window_starts < (position + code_sizes[code])[:, None]) & \
+                   (window_starts + code_sizes[window] > position[:, None])
+        delta = code_values[code] - (code_values[window] * overlaps).sum(axis=1)
+
+        accepted = (delta >= 0) | (rng.random(n_chains) < np.exp(np.minimum(delta, 0) / temperature))
+        window = np.where(overlaps, -1, window)
+        window[:, center] = code
+        states[chains[accepted, None], columns[accepted]] = window[accepted]
+        values += np.where(accepted, delta, 0)
+
+        improved = values > best_values
+        best_states[improved] = states[improved]
+        best_values[improved] = values[improved]
+
+        if control is not None:
+            best = int(np.argmax(best_values))
+            # the roll is only built if the control is polled
+            control.update(int(best_values[best]),
+                           partial(state_to_roll, best_states[best, max_size:max_size + roll_size].copy(), defects))
+            if control.should_stop():
+                break
+
+    best = int(np.argmax(best_values))
+    return state_to_roll(best_states[best, max_size:max_size + roll_size], defects)
+
+
+# builds the roll of the state of a chain, with None for the empty units between the biscuits
+def state_to_roll(state, defects=None):
+    starts = np.flatnonzero(state >= 0)
+    return RollLayout(len(state), state[starts], starts, defects=defects).to_roll()
+
+
+if __name__ == '__main__':
+    best_roll = annealing()
+    print(f'Best price is : {best_roll.total_price()}, best number of biscuits is :{best_roll.number_of_biscuits()}')
+    print(f'Roll is valid : {best_roll.check_biscuits_tolerance()}')
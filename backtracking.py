@@ -1,13 +1,17 @@
-from biscuits_clement import biscuit_types, defects_list, Roll
+from biscuits_clement import biscuit_types, get_defects, Roll, feasibility_mask
 
 
 # Helper function to check if a biscuit can be placed considering defects and overlapping
-def is_valid_position(start, biscuit, roll, defects_list):
+# valid_starts is the row of the biscuit in the feasibility mask, when given it replaces the defects count
+def is_valid_position(start, biscuit, roll, defects_list, valid_starts=None):
     # Check for overlap
     for other in roll._biscuits:
         if start < other['end'] and other['start'] < start + biscuit.size:
             return False  # Overlap detected
 
+    if valid_starts is not None:
+        return start < len(valid_starts) and valid_starts[start]
+
     # Check defects within the biscuit's range
     defects_in_range = [defect for defect in defects_list if start <= defect['x'] < start + biscuit.size]
     defect_counts = {defect_class: 0 for defect_class in biscuit.tolerance.keys()}
@@ -19,24 +23,28 @@ def is_valid_position(start, biscuit, roll, defects_list):
 
 
 # Backtracking algorithm
-def place_biscuits(roll, biscuits, defects_list, position=0):
+def place_biscuits(roll, biscuits, defects_list, position=0, mask=None):
     if position >= roll.roll_size:  # Reached the end of the roll
         return roll.total_value(), roll._biscuits.copy()
 
+    # The feasibility of every biscuit at every position is computed once, and passed down the recursion
+    if mask is None:
+        mask = feasibility_mask(roll.roll_size, biscuits, defects_list).tolist()
+
     max_value = 0
     best_arrangement = None
 
-    for biscuit in biscuits:
-        if is_valid_position(position, biscuit, roll, defects_list):
+    for i, biscuit in enumerate(biscuits):
+        if is_valid_position(position, biscuit, roll, defects_list, mask[i]):
             # Create a new biscuit dict to represent the placed biscuit
             biscuit_dict = {'start': position, 'end': position + biscuit.size, 'biscuit': biscuit}
             # Place the biscuit
             roll.append_biscuits(biscuit_dict)  # Now passing a dict object
             # Recurse to the next position
-            value, arrangement = place_biscuits(roll, biscuits, defects_list, position + biscuit.size)
+            value, arrangement = place_biscuits(roll, biscuits, defects_list, position + biscuit.size, mask)
 
     # Consider not placing a biscuit at this position
-    value, arrangement = place_biscuits(roll, biscuits, defects_list, position + 1)
+    value, arrangement = place_biscuits(roll, biscuits, defects_list, position + 1, mask)
     if value > max_value:
         max_value = value
         best_arrangement = arrangement
@@ -44,28 +52,29 @@ def place_biscuits(roll, biscuits, defects_list, position=0):
     return max_value, best_arrangement
 
 
-# Instantiate a Roll object
-roll = Roll(roll_size=500)
-# Sort biscuits by value, descending (as a heuristic)
-sorted_biscuits = sorted(biscuit_types, key=lambda b: -b.value)
+if __name__ == '__main__':
+    # Instantiate a Roll object
+    roll = Roll(roll_size=500)
+    # Sort biscuits by value, descending (as a heuristic)
+    sorted_biscuits = sorted(biscuit_types, key=lambda b: -b.value)
 
-# Find the best arrangement
-total_value, arrangement = place_biscuits(roll, sorted_biscuits, defects_list)
+    # Find the best arrangement
+    total_value, arrangement = place_biscuits(roll, sorted_biscuits, get_defects().to_dicts())
 
-# Create a new Roll object with the best arrangement
-best_roll = Roll(roll_size=500)
-best_roll._biscuits = arrangement  # Directly setting the best arrangement
+    # Create a new Roll object with the best arrangement
+    best_roll = Roll(roll_size=500)
+    best_roll._biscuits = arrangement  # Directly setting the best arrangement
 
-# Now you can access the total value and other properties of the best_roll
-print(f"The total value of the best roll is: {best_roll.total_value()}")
-print(f"The biscuits counts of the best roll is: {best_roll.biscuit_type_count()}")
+    # Now you can access the total value and other properties of the best_roll
+    print(f"The total value of the best roll is: {best_roll.total_value()}")
+    print(f"The biscuits counts of the best roll is: {best_roll.biscuit_type_count()}")
 
-# To get the number of each biscuit type in the best arrangement
-biscuit_count = {}
-for biscuit_info in best_roll._biscuits:
-    biscuit_type = type(biscuit_info['biscuit'])
-    biscuit_count[biscuit_type] = biscuit_count.get(biscuit_type, 0) + 1
+    # To get the number of each biscuit type in the best arrangement
+    biscuit_count = {}
+    for biscuit_info in best_roll._biscuits:
+        biscuit_type = type(biscuit_info['biscuit'])
+        biscuit_count[biscuit_type] = biscuit_count.get(biscuit_type, 0) + 1
 
-print("Number of each biscuit type in the best arrangement:")
-for biscuit_type, count in biscuit_count.items():
-    print(f"{biscuit_type}: {count}")
+    print("Number of each biscuit type in the best arrangement:")
+    for biscuit_type, count in biscuit_count.items():
+        print(f"{biscuit_type}: {count}")
@@ -0,0 +1,105 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import biscuits_clement
+from annealing import annealing
+from bees import bee_search, evaluate_roll
+from biscuits_racel import RollLayout
+from bogo import bogo_batch
+from defects import DEFAULT_DEFECTS_PATH, Defects, load_defects
+from dynamic import dynamic_programming
+from greedy import greedy_heuristic
+
+
+# Each engine solves one roll from its size and its defects, and returns the solved roll and its price
+# the options are passed to the engine function
+def solve_greedy(roll_size, defects, **options):
+    roll = greedy_heuristic(roll_size, defects)
+    return roll, roll.total_value()
+
+
+def solve_bees(roll_size, defects, **options):
+    food = bee_search(evaluate_roll, roll_size=roll_size, defects=defects, **options)
+    return food.location, evaluate_roll(food.location)
+
+
+def solve_bogo(roll_size, defects, max_iter=500, **options):
+    return bogo_batch(max_iter, roll_size=roll_size, defects=defects, **options)
+
+
+def solve_dynamic(roll_size, defects, **options):
+    roll = dynamic_programming(roll_size, defects=defects, **options)
+    return roll, roll.total_price()
+
+
+def solve_annealing(roll_size, defects, **options):
+    roll = annealing(roll_size=roll_size, defects=defects, **options)
+    return roll, roll.total_price()
+
+
+engines = {
+    'greedy': solve_greedy,
+    'bees': solve_bees,
+    'bogo': solve_bogo,
+    'dynamic': solve_dynamic,
+    'annealing': solve_annealing,
+}
+
+
+# the defects of a roll can be given as the path of a csv file, a Defects or a list of {'x', 'class'} dicts
+def read_defects(defects):
+    if isinstance(defects, str):
+        return load_defects(defects)
+    if isinstance(defects, Defects):
+        return defects
+    return Defects.from_dicts(defects)
+
+
+# layout of the roll of an engine, without defects
+# the rolls of biscuits_clement (greedy) are converted to rolls of biscuits_racel: a biscuit with less defects
+# than its tolerance in [start, end) has at most as many strictly inside it, so they stay valid
+def as_layout(roll_size, roll):
+    if isinstance(roll, biscuits_clement.Roll):
+        return RollLayout.from_placements(roll_size, roll._biscuits)
+    layout = RollLayout.from_roll(roll)
+    layout.defects = None
+    return layout
+
+
+# solves one roll, in a process of the pool
+def solve_roll(job):
+    index, engine, roll_size, defects, options = job
+    start = time.perf_counter()
+    roll, price = engines[engine](roll_size, read_defects(defects), **options)
+    return {
+        'index': index,
+        'engine': engine,
+        'roll_size': roll_size,
+        'roll': roll,
+        'price': price,
+        'time': time.perf_counter() - start,
+    }
+
+
+# Solves many rolls concurrently in a process pool, each roll with its own defects
+# rolls is an iterable of (roll_size, defects), and engine is one of the engines above
+# The engines only use the defects they are given, so the solves do not share any state.
+# The results are yielded as soon as each solve completes, not in the order of the rolls:
+# each result is a dict with the index of the roll, the engine, the roll size, the solved roll, its price
+# and the time of the solve in seconds
+def solve_rolls(rolls, engine='greedy', n_processes=None, **options):
+    if engine not in engines:
+        raise ValueError(f'Unknown engine {engine}, engines are {list(engines)}')
+    with ProcessPoolExecutor(max_workers=n_processes) as pool:
+        futures = [
+            pool.submit(solve_roll, (index, engine, roll_size, defects, options))
+            for index, (roll_size, defects) in enumerate(rolls)
+        ]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+if __name__ == '__main__':
+    for engine in engines:
+        for result in solve_rolls([(500, DEFAULT_DEFECTS_PATH)] * 2, engine=engine, n_processes=2):
+            print(f"Roll {result['index']} solved by {result['engine']} : "
+                  f"price is {result['price']}, in {result['time']:.3f} s")
@@ -1,285 +1,421 @@
 import numpy as np
-from biscuits_racel import Roll, biscuit_types
-from numpy.random import default_rng
+import biscuits_racel
+from biscuits_racel import Roll, RollLayout, biscuit_types, as_defects_index
+from numpy.random import default_rng, SeedSequence
+from concurrent.futures import ProcessPoolExecutor
+from collections import OrderedDict
+from itertools import count
+from profiling import Profiler
+from search_control import SearchControl, check_bounded
 
 # assign rng
 rng = default_rng()
 
-# name of bees
-# We added these names for debugging purposes
-names = ["Patricia",
-         "Jaqueline",
-         "Georgia",
-         "Valentine",
-         "Sylvie",
-         "Aurore",
-         "Sandrine",
-         "Catherine",
-         "Véronique",
-         "Marie-Paule",
-         "Annelise",
-         "Olga",
-         "Édmée",
-         "Anahide",
-         "Zoé"]
-
 
+# the price and validity of the roll are kept up to date by its incremental evaluator,
+# so evaluating a neighbour only costs the biscuits the move has changed
 def evaluate_roll(roll):
-    if roll.check_biscuits_tolerance():
-        return roll.total_price()
+    evaluator = roll.evaluator()
+    if evaluator.is_valid():
+        return evaluator.price
     else:
         return 0.0
 
 
+# reseeds the random generators used by the search (here and in biscuits_racel), so that a run can be reproduced
+def seed_search(seed):
+    global rng
+    rng = default_rng(seed)
+    biscuits_racel.rng = rng
+
+
+# The minimize parameter indicates whether the objective function should be minimized,
+# in which case it should maximize the opposite, or not.
+# It is a class rather than a closure so that the bees can be sent to other processes
+# The values of the last cache_size rolls evaluated are kept, by Roll.layout_key, and the least recently used
+# is evicted first: the bees often come back to the same layouts. The key of a roll follows its changes,
+# so a roll changed in place is evaluated again. A cache_size of 0 or None disables the cache
+class Fitness:
+    def __init__(self, obj_func, minimize=False, cache_size=4096):
+        self.obj_func = obj_func
+        self.minimize = minimize
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        # number of evaluations of the objective function, and statistics of the cache, see profiling.Profiler
+        self.calls = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def counters(self):
+        return {'objective_calls': self.calls, 'cache_hits': self.hits, 'cache_misses': self.misses,
+                'cache_evictions': self.evictions}
+
+    # the cache is not sent to the other processes with the bees, each process fills its own
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_cache'] = OrderedDict()
+        return state
+
+    def __call__(self, roll):
+        if self.cache_size:
+            key = roll.layout_key()
+            if key in self._cache:
+                self.hits += 1
+                self._cache.move_to_end(key)
+                value = self._cache[key]
+            else:
+                self.misses += 1
+                value = self.evaluate(roll)
+                self._cache[key] = value
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+                    self.evictions += 1
+        else:
+            value = self.evaluate(roll)
+        if self.minimize:
+            return -1 * value
+        return value
+
+    def evaluate(self, roll):
+        self.calls += 1
+        return self.obj_func(roll)
+
+
 # This function by default searches for the maximum of the objective function
 # Use the opposite of the function if you are searching for the minimum
+# With n_islands > 1, several independent hives search in parallel, see island_search
+# roll_size and defects describe the roll the bees search on, see biscuits_racel.as_defects_index
+# profiler is an optional profiling.Profiler, that records the counters and the timers of each iteration
+# cache_size is the number of roll values the fitness keeps, see Fitness
+# control is an optional search_control.SearchControl, that can stop the search before max_iter
+# (with a deadline or when the best quality stops improving) and lets other threads poll the best food source.
+# With a bounded control (see SearchControl.is_bounded), max_iter can be None:
+# the search runs until the control stops it
+# initial_rolls are rolls the first workers start from instead of random ones, see initial_food
 def bee_search(obj_func,
                minimize=False,
                n_bees=10,
                n_workers=None,
                n_scouts=1,
                max_iter=1000,
-               limit=5):
-    # The minimize parameter indicates whether the objective function should be minimized,
-    # in which case it should maximize the opposite, or not.
-    if minimize:
-        def fitness(roll):
-            return -1 * obj_func(roll)
-    else:
-        def fitness(roll):
-            return obj_func(roll)
+               limit=5,
+               n_islands=1,
+               migration_interval=10,
+               n_processes=None,
+               seed=None,
+               roll_size=500,
+               defects=None,
+               profiler=None,
+               cache_size=4096,
+               control=None,
+               initial_rolls=None):
+    check_bounded(max_iter, control)
+    fitness = Fitness(obj_func, minimize, cache_size)
+    # the defects are indexed once, all the rolls of the search share the index
+    if defects is not None:
+        defects = as_defects_index(defects)
 
     # initializing the number of worker bees, if None
     if n_workers is None:
         n_workers = n_bees // 2
-
+    if control is not None:
+        control.start()
+
+    if n_islands > 1:
+        return island_search(fitness, n_bees, n_workers, n_scouts, max_iter, limit,
+                             n_islands=n_islands,
+                             migration_interval=migration_interval,
+                             n_processes=n_processes,
+                             seed=seed,
+                             roll_size=roll_size,
+                             defects=defects,
+                             profiler=profiler,
+                             control=control,
+                             initial_rolls=initial_rolls)
+
+    if seed is not None:
+        seed_search(seed)
+    hive, best_quality_food = init_hive(fitness, n_bees, n_workers, n_scouts, limit, roll_size, defects,
+                                        initial_rolls)
+    return forage(hive, best_quality_food, fitness, max_iter, limit, profiler, control)
+
+
+# creates the hive and sends the workers to their initial food sources
+# returns the hive and the best food source found so far
+def init_hive(fitness, n_bees, n_workers, n_scouts, limit, roll_size=500, defects=None, initial_rolls=None):
     # Each worker should be assigned a food source
     # So the number of food source is equal to the number of workers
     n_foods = n_workers
 
-    # initialize the hive
-    hive = Hive({
-        'scouts': [Scout(fitness, name=rng.choice(names)) for _ in range(0, n_scouts)],
-        'onlookers':
-            [Onlooker(fitness, name=rng.choice(names)) for _ in range(0, n_bees - n_workers)],
-        'workers': [Worker(fitness, name=rng.choice(names)) for _ in range(0, n_workers)]
-    })
-
-    # generate an array of random coordinates in the search space
+    # the workers start from the initial rolls, if any
+    # then generate an array of random coordinates in the search space
     # of shape [[...] * food_sources_initial]
-    initial_foods = generate_new_food(n_foods, food_quantity=limit)
-
-    # Send all workers at the initial food
-    for worker, food in zip(hive.get_workers(), initial_foods):
-        worker.go_to_food(food)
-        worker.dance()
+    initial_foods = [initial_food(roll, limit, roll_size, defects) for roll in (initial_rolls or [])[:n_foods]]
+    n_random = n_foods - len(initial_foods)
+    if n_random == 1:
+        initial_foods.append(generate_new_food(1, food_quantity=limit, roll_size=roll_size, defects=defects))
+    elif n_random > 1:
+        initial_foods += generate_new_food(n_random, food_quantity=limit, roll_size=roll_size, defects=defects)
+
+    # the scouts have no food source yet, their sources are found by the first scouts phase
+    hive = Hive(n_foods + n_scouts, n_bees - n_workers, limit, roll_size=roll_size, defects=defects)
+    for source, food in enumerate(initial_foods):
+        food.quality = fitness(food.location)
+        hive.set_food(source, food)
 
     # Get the initial best food
-    best_quality_food = max(hive.get_workers(), key=lambda worker_bee: worker_bee.food.quality).food
+    best_quality_food = max(initial_foods, key=lambda food: food.quality)
+    return hive, best_quality_food
+
+
+# runs n_iter iterations of the algorithm on the hive, and returns the best food source found
+# the control can stop it earlier, n_iter can then be None
+def forage(hive, best_quality_food, fitness, n_iter, limit, profiler=None, control=None):
+    if profiler is not None:
+        profiled_sources = [fitness, as_defects_index(hive.defects)]
 
     # Algorithm loop
-    for i in range(max_iter):
-        """Workers phase"""
+    for i in count() if n_iter is None else range(n_iter):
+        if profiler is not None:
+            profiler.start_iteration(profiled_sources)
 
-        for worker in hive.get_workers():
-            # We first check if the source has been depleted by the onlookers
-            # Indeed we gave the ability for onlooker to bring food to the hive, 
-            # so the food source gets depleted by both type of bees.
-            # Because of the loop, if we have a food source of quantity value 0,
-            # the worker bee has to leave and join the scouts to search for a new food source.
-            if worker.should_leave():
-                new_scout = worker.leave_food_point()
-                hive.get_scouts().append(new_scout)
-                hive.get_workers().remove(worker)
-                continue
+        """Workers phase"""
+        # Each worker searches for a better food source around its own.
+        # The food sources get depleted by both the workers and the onlookers,
+        # an exhausted source is left, and the scouts replace it with a new one.
+        for source in np.flatnonzero(~hive.exhausted()).tolist():
+            improved, best_quality_food = explore(hive, source, fitness, limit, best_quality_food)
+            if improved and profiler is not None:
+                profiler.count('worker_improvements')
 
-            worker.dance()  # Workers register their food source and give them a food source quality value
-
-            # Search for a better food source around the current food source
-            new_solution = worker.look_around()
-            # Evaluate food source
-            new_solution_evaluation = worker.calculate_nectar(new_solution)
-            # If food source is better, discard old food source and select new open
-            # Else bring food to the hive, or leave if no more food is available
-            if new_solution_evaluation > worker.food.quality:
-                worker.food = new_solution
-                worker.dance()
-                if new_solution_evaluation > best_quality_food.quality:
-                    best_quality_food = new_solution
-            else:
-                worker.bring_food()
-                if worker.should_leave():
-                    new_scout = worker.leave_food_point()
-                    hive.get_scouts().append(new_scout)
-                    hive.get_workers().remove(worker)
+        if profiler is not None:
+            profiler.lap('workers')
 
         """Onlookers phase"""
         # Onlookers choose a food source, among the worker ones.
-        # This choice is made by probabilities, 
+        # This choice is made by probabilities,
         # otherwise they'd just choose the best one and never explore around the other ones.
+        # All the onlookers choose at once, see Hive.choose_sources
+        for source in hive.choose_sources(hive.n_onlookers).tolist():
+            # a source chosen by several onlookers can be exhausted by the previous ones
+            if hive.trials[source] >= hive.limit:
+                continue
+            improved, best_quality_food = explore(hive, source, fitness, limit, best_quality_food)
+            if improved and profiler is not None:
+                profiler.count('onlooker_improvements')
 
-        # Calculate the probability value of the sources
-        # with which they are preferred by the onlooker bees
-        # First they watch the bees dance
-        # choreography is of type (worker, worker.food, food.quality)
-        choreography = np.array([worker.dance() for worker in hive.get_workers()])
-        # print([c.quality for c in choreography[:, 0]])
-        choreography[:, 1] = np.array([dance if dance > float('-inf') else 0 for dance in choreography[:, 1]])
-        # convert -inf to 0
-        choreography[:, 1] = np.abs(np.nan_to_num(choreography[:, 1]))
-        # calculate the sum of all the qualities
-        sum_dances = np.sum(choreography[:, 1])
-        # for functions that are flat on most of their definition space, sum could be zero
-        # we have to check for that condition to prevent having nan values in the probabilities list
-        if sum_dances == 0.0:
-            probabilities = None
-        else:
-            # divide each value to get the probability for the onlooker to choose that food source
-            probabilities = np.divide(choreography[:, 1], sum_dances).astype('float64')
-            # In that case, every food source has the same probability of being chosen which is not optimal.
-            # We want to have most likeliness for the most promising source
-
-        for onlooker in hive.get_onlookers():
-            # Onlookers choose a food source, then dance.
-            onlooker.choose_preferred_source(choreography[:, 0], probabilities)
-            onlooker.dance()
-            # Onlookers search for a new food source
-            new_solution = onlooker.look_around()
-            # Evaluate food source
-            new_solution_evaluation = onlooker.calculate_nectar(new_solution)
-            # If food source is better, discard old food source and select new food source
-            if new_solution_evaluation > onlooker.food.quality:
-                onlooker.food = new_solution
-                onlooker.dance()
-                if new_solution_evaluation > best_quality_food.quality:
-                    best_quality_food = new_solution
-            # Else increase limit counter
-            else:
-                if onlooker.food.has_food():
-                    onlooker.bring_food()
-                # If the food is exhausted, leave the food source
-                if onlooker.should_leave():
-                    onlooker.leave_food_point()
+        if profiler is not None:
+            profiler.lap('onlookers')
 
         """Scouts phase"""
-        # Scouts search for a new food source around the search space. 
-        for scout in hive.get_scouts():
-            # Find a new food source
-            scout.find_new_food(quantity=limit)
-            # Convert back to worker and go on that food source
-            new_worker = scout.convert_worker(fitness)
-            hive.get_scouts().remove(scout)
-            hive.get_workers().append(new_worker)
+        # Scouts search for a new food source around the search space, to replace the exhausted ones.
+        for source in np.flatnonzero(hive.exhausted()).tolist():
+            if hive.locations[source] is not None and profiler is not None:
+                profiler.count('abandoned_sources')
+            new_food = generate_new_food(1, food_quantity=limit, roll_size=hive.roll_size, defects=hive.defects)
+            new_food.quality = fitness(new_food.location)
+            hive.set_food(source, new_food)
+            if new_food.quality > best_quality_food.quality:
+                best_quality_food = new_food
+            if profiler is not None:
+                profiler.count('new_food_sources')
+
+        if profiler is not None:
+            profiler.lap('scouts')
+            profiler.end_iteration(best_quality_food.quality)
+
+        if control is not None:
+            control.update(best_quality_food.quality, best_quality_food)
+            if control.should_stop():
+                break
 
     return best_quality_food
 
 
+# a bee searches around a food source of the hive: if the new food source is better, it replaces it,
+# otherwise the bee brings food from it, and the trials of the source increase
+# returns whether the source was improved, and the best food source found so far
+def explore(hive, source, fitness, limit, best_quality_food):
+    new_food = single_axis_change(hive.food(source), quantity=limit)
+    new_food.quality = fitness(new_food.location)
+    if new_food.quality > hive.qualities[source]:
+        hive.set_food(source, new_food)
+        if new_food.quality > best_quality_food.quality:
+            best_quality_food = new_food
+        return True, best_quality_food
+    hive.trials[source] += 1
+    return False, best_quality_food
+
+
+# Island model: n_islands hives search independently, each one in a process of the pool.
+# Every migration_interval iterations, the islands come back to this process,
+# and the best food source of each island replaces the worst worker food source of the next one (ring topology).
+# Each island has its own seed, derived from seed, so a run can be reproduced whatever the number of processes
+# The control is checked after each migration, the islands only stop on its deadline before
+def island_search(fitness, n_bees, n_workers, n_scouts, max_iter, limit,
+                  n_islands=4,
+                  migration_interval=10,
+                  n_processes=None,
+                  seed=None,
+                  roll_size=500,
+                  defects=None,
+                  profiler=None,
+                  control=None,
+                  initial_rolls=None):
+    island_seeds = SeedSequence(seed).spawn(n_islands)
+    islands = [(None, None)] * n_islands
+
+    with ProcessPoolExecutor(max_workers=n_processes) as pool:
+        done = 0
+        deadline = None if control is None else control.current_deadline()
+        while max_iter is None or done < max_iter:
+            n_iter = migration_interval if max_iter is None else min(migration_interval, max_iter - done)
+            tasks = [
+                (hive, best, fitness, n_bees, n_workers, n_scouts, n_iter, limit, roll_size, defects,
+                 island_seed.spawn(1)[0], None if profiler is None else done, deadline, initial_rolls)
+                for (hive, best), island_seed in zip(islands, island_seeds)
+            ]
+            results = list(pool.map(run_island, tasks))
+            islands = [(hive, best) for hive, best, _ in results]
+            # the records of the islands are gathered in the profiler of the search
+            if profiler is not None:
+                for island, (_, _, records) in enumerate(results):
+                    for record in records:
+                        profiler.add_record(dict(record, island=island))
+            done += n_iter
+            migrate(islands)
+            if control is not None:
+                best = max((best for _, best in islands), key=lambda food: food.quality)
+                control.update(best.quality, best)
+                if control.should_stop():
+                    break
+
+    return max((best for _, best in islands), key=lambda food: food.quality)
+
+
+# runs an island in a process of the pool, the hive is created on the first call
+# if first_iteration is not None, the iterations are profiled and their records are returned
+# if deadline is not None, the island stops at the deadline
+def run_island(task):
+    (hive, best_quality_food, fitness, n_bees, n_workers, n_scouts, n_iter, limit, roll_size, defects,
+     island_seed, first_iteration, deadline, initial_rolls) = task
+    seed_search(island_seed)
+    if hive is None:
+        hive, best_quality_food = init_hive(fitness, n_bees, n_workers, n_scouts, limit, roll_size, defects,
+                                            initial_rolls)
+    profiler = None if first_iteration is None else Profiler(first_iteration=first_iteration)
+    control = None
+    if deadline is not None:
+        control = SearchControl(deadline=deadline)
+        control.start()
+    best_quality_food = forage(hive, best_quality_food, fitness, n_iter, limit, profiler, control)
+    return hive, best_quality_food, [] if profiler is None else profiler.records
+
+
+# sends a copy of the best food source of each island to the worst food source of the next island
+def migrate(islands):
+    migrants = [best.copy() for _, best in islands]
+    for i, (hive, best) in enumerate(islands):
+        if not len(hive):
+            continue
+        migrant = migrants[i - 1]
+        worst = int(np.argmin(hive.qualities))
+        if migrant.quality > hive.qualities[worst]:
+            hive.set_food(worst, migrant)
+
+
+# The hive is kept as a struct of arrays: the food sources of the workers are the rolls of locations,
+# and their qualities and trials (the searches around the source that did not improve it, since it was found)
+# are NumPy arrays, one entry per source. A source is exhausted after limit trials, the food it had.
+# The onlookers are only a number: at each iteration, they all choose a source at once.
+# roll_size and defects describe the roll on which the scouts look for new food sources
 class Hive:
-
-    def __init__(self, bees):
-        self.bees = bees
-
-    def get_workers(self):
-        return self.bees['workers']
-
-    def get_onlookers(self):
-        return self.bees['onlookers']
-
-    def get_scouts(self):
-        return self.bees['scouts']
-
-    def get_unemployed(self):
-        return self.bees['scouts'] + self.bees['onlookers']
-
-
-class Bee:
-    # job is the bee's job, either onlooker, employee, or scout
-    # evaluate is the value of the food location by the objective function of the alg, see the
-    # food_source is the food source coordinates on which the flower is located
-    # it is the possible solution it represents
-    def __init__(self, evaluate, food=None, name=None):
-        self.food = food
-        self.name = name
-        self._evaluate = evaluate
-
-    def go_to_food(self, food):
-        self.food = food
-
-    def calculate_nectar(self, food=None):
-        if food is None:
-            return self._evaluate(self.food.location)
-        else:
-            return self._evaluate(food.location)
-
-
-class EmployedBee(Bee):
-
-    def should_leave(self):
-        return self.food.is_exhausted()
-
-    def bring_food(self):
-        self.food.quantity -= 1
-
-    def look_around(self):
-        return single_axis_change(self.food)
-
-    def dance(self):
-        if self.food.quality is None:
-            quality = self.calculate_nectar(self.food)
-            self.food.quality = quality
-        return self.food, self.food.quality
-
-
-class Worker(EmployedBee):
-
-    def leave_food_point(self):
-        self.food = None
-        return Scout(self._evaluate, name=self.name)
-
-
-class Onlooker(EmployedBee):
-
-    def leave_food_point(self):
-        self.food = None
-
-    def choose_preferred_source(self, choreography, probabilities=None):
-        self.go_to_food(rng.choice(choreography, p=probabilities))
-
-
-class Scout(Bee):
-
-    def find_new_food(self, quantity=1):
-        new_food = generate_new_food(1, quantity)
-        self.food = new_food
-
-    def convert_worker(self, evaluate):
-        return Worker(evaluate, food=self.food, name=self.name)
+    def __init__(self, n_foods, n_onlookers, limit=5, roll_size=500, defects=None):
+        self.n_onlookers = n_onlookers
+        self.limit = limit
+        self.roll_size = roll_size
+        self.defects = defects
+        self.locations = [None] * n_foods
+        self.qualities = np.full(n_foods, float('-inf'))
+        # the sources without a location are exhausted, the scouts fill them
+        self.trials = np.full(n_foods, limit, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.locations)
+
+    def exhausted(self):
+        return self.trials >= self.limit
+
+    # food source of index source, as a Food, its quantity is the food left
+    def food(self, source):
+        return Food(self.locations[source], self.qualities[source], self.limit - int(self.trials[source]))
+
+    # puts food at index source, its quality has to be known, and its trials start again from 0
+    def set_food(self, source, food):
+        self.locations[source] = food.location
+        self.qualities[source] = food.quality
+        self.trials[source] = 0
+
+    # sources chosen by n onlookers, by roulette wheel selection among the sources that are not exhausted:
+    # the probability of a source is proportional to its quality (-inf and nan count as 0),
+    # or the same for all of them if all the qualities are 0.
+    # The n draws are one search of n random numbers in the cumulative sum of the qualities
+    def choose_sources(self, n):
+        active = ~self.exhausted()
+        if n == 0 or not active.any():
+            return np.empty(0, dtype=np.int64)
+        weights = np.where(active & np.isfinite(self.qualities), np.abs(self.qualities), 0.0)
+        if weights.sum() == 0.0:
+            weights = active.astype(np.float64)
+        cumulative = np.cumsum(weights)
+        sources = np.searchsorted(cumulative, rng.random(n) * cumulative[-1], side='right')
+        return np.minimum(sources, len(cumulative) - 1)
 
 
 # generate an array of random coordinates in the search space of shape  (*,food_sources_initial)
-def generate_new_food(number_of_food_sources, food_quantity=5):
+def generate_new_food(number_of_food_sources, food_quantity=5, roll_size=500, defects=None):
     if number_of_food_sources == 1:
-        new_roll = Roll(500)
+        new_roll = Roll(roll_size, defects)
         new_roll.fill_roll_random()
         return Food(new_roll, quantity=food_quantity)
 
     foods = []
     for i in range(number_of_food_sources):
-        new_roll = Roll(500)
+        new_roll = Roll(roll_size, defects)
         new_roll.fill_roll_random()
         foods.append(Food(new_roll, quantity=food_quantity))
 
     return foods
 
 
+# food source of a roll given to the search: a Roll, a RollLayout, or a list of {'start', 'end', 'biscuit'}
+# placements such as the ones of greedy.greedy_heuristic, see RollLayout.from_placements
+# the roll is built again on the roll of the search, with its defects: the defects a roll or a layout comes with
+# are not the ones the search evaluates. A roll of another size raises a ValueError
+def initial_food(roll, food_quantity=5, roll_size=500, defects=None):
+    if isinstance(roll, Roll):
+        roll = RollLayout.from_roll(roll)
+    if isinstance(roll, RollLayout):
+        if roll.roll_size != roll_size:
+            raise ValueError(f'Initial roll of size {roll.roll_size}, the search is on a roll of size {roll_size}')
+        layout = RollLayout(roll_size, roll.codes, roll.starts, defects)
+    else:
+        if any(placement['end'] > roll_size for placement in roll):
+            raise ValueError(f'Initial placements end after the roll of size {roll_size}')
+        layout = RollLayout.from_placements(roll_size, roll, defects)
+    return Food(layout.to_roll(), quantity=food_quantity)
+
+
+# the new food source is on a copy of the roll of the original one, which shares all its biscuits but the changed one
+# (see biscuits_racel.Roll.copy), so the original food source keeps its roll
 def single_axis_change(original_food, quantity=5):
     old_roll = original_food.location
     number_of_biscuits = old_roll.number_of_biscuits()
     swap_index = rng.integers(number_of_biscuits)
-    new_roll = old_roll
-    new_roll.get_biscuits().pop(swap_index)
+    new_roll = old_roll.copy()
     new_biscuit = rng.choice(biscuit_types)
-    new_roll.insert_biscuits(swap_index, new_biscuit)
+    new_roll.replace_biscuit(swap_index, new_biscuit)
     new_food = Food(new_roll, quantity=quantity)
     return new_food
 
@@ -288,10 +424,14 @@ class Food:
 
     def __init__(self, location, quality=None, quantity=0.0):
         self.location = location
-        # quality will be determined upon dancing
+        # quality is set when the food source is found, by the fitness of its roll
         self.quality = quality
         self.quantity = quantity
 
+    # new food source on a copy of the roll, see biscuits_racel.Roll.copy
+    def copy(self):
+        return Food(self.location.copy(), self.quality, self.quantity)
+
     def has_food(self):
         return self.quantity > 0
 
@@ -0,0 +1,175 @@
+import argparse
+import importlib
+import json
+import multiprocessing
+import resource
+import sys
+import time
+from defects import generate_defects
+
+# defect densities (mean number of defects per unit of dough) and class mixes of the synthetic rolls
+densities = {
+    'sparse': 0.1,
+    'medium': 1.0,
+    'dense': 3.0,
+}
+class_mixes = {
+    'uniform': {'a': 1 / 3, 'b': 1 / 3, 'c': 1 / 3},
+    'mostly_a': {'a': 0.8, 'b': 0.1, 'c': 0.1},
+    'mostly_c': {'a': 0.1, 'b': 0.1, 'c': 0.8},
+}
+
+# biggest roll each engine is run on, the bigger rolls are recorded as skipped
+# backtracking is exponential, and recurses once per unit of dough
+max_sizes = {
+    'greedy': 1_000_000,
+    'backtracking': 24,
+    'bogo': 100_000,
+    'bees': 50_000,
+    'dynamic': 10_000_000,
+    'annealing': 100_000,
+}
+
+
+# Each engine solves a roll and returns the price of its solution,
+# and the number of evaluations it made (candidate placements or rolls it checked), None when it is not counted:
+# greedy and dynamic work on whole feasibility masks, their lookups are array operations that are not counted
+def run_greedy(roll_size, defects, options):
+    from greedy import greedy_heuristic
+    roll = greedy_heuristic(roll_size, defects)
+    return roll.total_value(), None
+
+
+def run_backtracking(roll_size, defects, options):
+    from backtracking import place_biscuits
+    from biscuits_clement import Roll, biscuit_types
+    sorted_biscuits = sorted(biscuit_types, key=lambda b: -b.value)
+    value, _ = place_biscuits(Roll(roll_size), sorted_biscuits, defects.to_dicts())
+    return value, None
+
+
+def run_bogo(roll_size, defects, options):
+    from bogo import bogo_batch
+    n_samples = options.get('bogo_samples', 10000)
+    _, value = bogo_batch(n_samples, roll_size=roll_size, defects=defects)
+    return value, n_samples
+
+
+# objective of the bees that counts its calls
+class CountedEvaluation:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, roll):
+        from bees import evaluate_roll
+        self.calls += 1
+        return evaluate_roll(roll)
+
+
+def run_bees(roll_size, defects, options):
+    from bees import bee_search, evaluate_roll
+    objective = CountedEvaluation()
+    food = bee_search(objective, roll_size=roll_size, defects=defects,
+                      n_bees=options.get('bees', 20), max_iter=options.get('bees_iter', 100))
+    return evaluate_roll(food.location), objective.calls
+
+
+def run_annealing(roll_size, defects, options):
+    from annealing import annealing
+    n_steps, n_chains = options.get('annealing_steps', 10000), options.get('annealing_chains', 256)
+    roll = annealing(n_steps, n_chains, roll_size=roll_size, defects=defects)
+    return roll.total_price(), n_steps * n_chains
+
+
+def run_dynamic(roll_size, defects, options):
+    from dynamic import dynamic_programming
+    roll = dynamic_programming(roll_size, defects=defects)
+    return roll.total_price(), None
+
+
+engines = {
+    'greedy': run_greedy,
+    'backtracking': run_backtracking,
+    'bogo': run_bogo,
+    'bees': run_bees,
+    'dynamic': run_dynamic,
+    'annealing': run_annealing,
+}
+
+
+# runs one case in a fresh process, so that its peak memory is its own
+# the defects are generated in the process from their seed, and the result is sent back through connection
+def run_case(case, options, connection):
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10 * case['roll_size'] + 1000))
+    defects = generate_defects(case['roll_size'], densities[case['density']], class_mixes[case['mix']],
+                               seed=case['seed'])
+    # each engine is in the module of the same name, it is imported before the timer starts
+    importlib.import_module(case['engine'])
+    start = time.perf_counter()
+    value, evaluations = engines[case['engine']](case['roll_size'], defects, options)
+    elapsed = time.perf_counter() - start
+    connection.send(dict(
+        case,
+        status='ok',
+        n_defects=len(defects),
+        value=value,
+        time=elapsed,
+        evaluations=evaluations,
+        evaluations_per_second=None if evaluations is None else evaluations / elapsed,
+        # ru_maxrss is in kilobytes on Linux
+        peak_memory_kb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    ))
+
+
+def benchmark_case(case, options, timeout):
+    if case['roll_size'] > max_sizes[case['engine']]:
+        return dict(case, status='skipped')
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=run_case, args=(case, options, sender))
+    process.start()
+    sender.close()
+    try:
+        if receiver.poll(timeout):
+            return receiver.recv()
+        return dict(case, status='timeout', time=timeout)
+    except EOFError:
+        return dict(case, status='error', exitcode=process.exitcode)
+    finally:
+        process.kill()
+        process.join()
+
+
+# runs every engine on every synthetic roll, and writes one json record per line
+# the records can be diffed between two releases
+def benchmark(engine_names, sizes, density_names, mix_names, seeds, options=None, timeout=600.0, output=sys.stdout):
+    if options is None:
+        options = {}
+    for roll_size in sizes:
+        for density in density_names:
+            for mix in mix_names:
+                for seed in seeds:
+                    for engine in engine_names:
+                        case = {'engine': engine, 'roll_size': roll_size, 'density': density, 'mix': mix,
+                                'seed': seed}
+                        output.write(json.dumps(benchmark_case(case, options, timeout)) + '\n')
+                        output.flush()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark of the biscuit engines on synthetic rolls')
+    parser.add_argument('--engines', nargs='+', default=list(engines), choices=list(engines))
+    parser.add_argument('--sizes', nargs='+', type=int, default=[500, 5000, 50000])
+    parser.add_argument('--densities', nargs='+', default=list(densities), choices=list(densities))
+    parser.add_argument('--mixes', nargs='+', default=['uniform'], choices=list(class_mixes))
+    parser.add_argument('--seeds', nargs='+', type=int, default=[0])
+    parser.add_argument('--timeout', type=float, default=600.0, help='seconds allowed to each run')
+    parser.add_argument('--output', default=None, help='json lines file, the standard output by default')
+    args = parser.parse_args()
+
+    output = sys.stdout if args.output is None else open(args.output, 'w')
+    try:
+        benchmark(args.engines, args.sizes, args.densities, args.mixes, args.seeds,
+                  timeout=args.timeout, output=output)
+    finally:
+        if output is not sys.stdout:
+            output.close()
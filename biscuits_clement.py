@@ -1,18 +1,29 @@
-from csv import DictReader
 from copy import deepcopy
 import numpy as np
+from catalog import Catalog, load_catalog, tolerance_mask
+from defects import Defects, load_defects
 
 rng = np.random.default_rng()
 
-with open('defects.csv', 'r') as f:
-    defects_list = DictReader(f)
+# csv file of the defects of the roll
+# the defects are only loaded when they are first needed, see get_defects
+defects_path = None
+_defects = None
 
-    def x_to_float(elem):
-        elem['x'] = float(elem['x'])
-        return elem
 
-    defects_list = map(x_to_float, defects_list)
-    defects_list = list(sorted(defects_list, key=lambda d: d['x']))
+def get_defects():
+    global _defects
+    if _defects is None:
+        _defects = load_defects(defects_path)
+    return _defects
+
+
+# defects_list is still available as a module attribute, as a list of {'x', 'class'} dicts sorted by x
+# it triggers the loading of the defects the first time it is accessed
+def __getattr__(name):
+    if name == 'defects_list':
+        return get_defects().to_dicts()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 class Biscuit:
@@ -28,12 +39,27 @@ class Biscuit:
         return True
 
 
-biscuit_types = [
-    Biscuit(4, 6, {'a': 4, 'b': 2, 'c': 3}),
-    Biscuit(8, 12, {'a': 5, 'b': 4, 'c': 4}),
-    Biscuit(2, 1, {'a': 1, 'b': 2, 'c': 1}),
-    Biscuit(5, 8, {'a': 2, 'b': 3, 'c': 2})
-]
+# the biscuit types of the catalog file (see catalog.load_catalog), in its order
+biscuit_types = load_catalog().biscuits(Biscuit)
+
+
+# boolean matrix of shape [len(biscuits), roll_size]
+# mask[i, position] is True if biscuits[i] can start at position:
+# it fits on the roll, and the defects in [position, position + size) are within its tolerance.
+# The biscuits are compiled into a catalog (see catalog.Catalog), and all the types are checked at all the
+# positions with array comparisons against the defects counted once per class (see catalog.tolerance_mask)
+# defects can be a Defects or a list of {'x', 'class'} dicts, by default the defects of defects_path
+def feasibility_mask(roll_size, biscuits=None, defects=None):
+    if biscuits is None:
+        biscuits = biscuit_types
+    if defects is None:
+        defects = get_defects()
+    elif not isinstance(defects, Defects):
+        defects = Defects.from_dicts(defects)
+    catalog = Catalog.from_biscuits(biscuits)
+    # a biscuit holds strictly less defects of a class than its tolerance
+    max_counts = catalog.tolerance_matrix(defects.class_names) - 1
+    return tolerance_mask(defects, roll_size, catalog.sizes, max_counts, inside=False)
 
 
 class Roll:
@@ -127,4 +153,4 @@ class Roll:
 
     @staticmethod
     def get_defects_between(a, b):
-        return filter(lambda roll_defect: a < roll_defect['x'] < b, defects_list)
+        return filter(lambda roll_defect: a < roll_defect['x'] < b, get_defects().to_dicts())
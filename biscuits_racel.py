@@ -1,23 +1,160 @@
-from csv import DictReader
-from copy import deepcopy
 import numpy as np
+from catalog import Catalog, load_catalog, tolerance_mask
+from defects import Defects, load_defects
+from persistent import ChunkedList
 
 rng = np.random.default_rng()
 
-with open('defects.csv', 'r') as f:
-    defects_list = DictReader(f)
-
-    # This throws a bug that empties defects_list
-    # defect_types = set([defect['class'] for defect in defects_list])
-
-    def x_to_float(elem):
-        elem['x'] = float(elem['x'])
-        return elem
-
-
-    defects_list = map(x_to_float, defects_list)
-    defects_list = list(sorted(defects_list, key=lambda d: d['x']))
-    defect_types = set([defect['class'] for defect in defects_list])
+# csv file of the defects of the roll
+# the defects are only loaded when they are first needed, see get_defects_index
+defects_path = None
+_defects_index = None
+
+
+# index over the defects of a roll
+# the defects are kept sorted by x, and for each class we also keep the sorted x coordinates of its defects,
+# so a range query is two bisections (per class) instead of a scan of the whole defects list
+# the defects can be a Defects or a list of {'x', 'class'} dicts
+class DefectIndex:
+    def __init__(self, defects):
+        if not isinstance(defects, Defects):
+            defects = Defects.from_dicts(defects)
+        self.defects = defects
+        self.xs = defects.xs
+        self.xs_by_class = defects.xs_by_class()
+        self.defect_types = set(defects.class_names)
+        # feasibility masks already computed, by roll size and biscuit types
+        self._masks = {}
+        # number of range queries and of feasibility mask lookups, see counters
+        self.queries = 0
+        self.mask_hits = 0
+        self.mask_misses = 0
+
+    def __len__(self):
+        return len(self.defects)
+
+    # an index is shared by all the rolls cut in the same dough, copying a roll should not copy it
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def counters(self):
+        return {'defect_queries': self.queries, 'mask_cache_hits': self.mask_hits,
+                'mask_cache_misses': self.mask_misses}
+
+    # defects strictly between a and b
+    def between(self, a, b):
+        self.queries += 1
+        return self.defects.to_dicts(np.searchsorted(self.xs, a, side='right'),
+                                     np.searchsorted(self.xs, b, side='left'))
+
+    # generator over the defects strictly between a and b
+    # it starts directly at the first defect after a, and stops at the first defect after b
+    def iter_between(self, a, b):
+        self.queries += 1
+        i = int(np.searchsorted(self.xs, a, side='right'))
+        while i < len(self.xs) and self.xs[i] < b:
+            yield {'x': float(self.xs[i]), 'class': self.defects.class_names[self.defects.classes[i]]}
+            i += 1
+
+    # number of defects of each class strictly between a and b
+    def count_between(self, a, b):
+        self.queries += 1
+        return {
+            defect_type: int(np.searchsorted(xs, b, side='left') - np.searchsorted(xs, a, side='right'))
+            for defect_type, xs in self.xs_by_class.items()
+        }
+
+    # boolean matrix of shape [len(biscuits), roll_size]
+    # mask[i, position] is True if biscuits[i] can start at position:
+    # it does not spill over the roll, and the defects strictly inside it are within its tolerance.
+    # The biscuits are compiled into a catalog (see catalog.Catalog), and all the types are checked at all the
+    # positions with array comparisons against the defects counted once per class (see catalog.tolerance_mask).
+    # The matrix is cached, so every engine can then check a position in O(1)
+    def feasibility_mask(self, roll_size, biscuits=None):
+        if biscuits is None:
+            biscuits = biscuit_types
+        key = (roll_size, tuple(biscuits))
+        if key in self._masks:
+            self.mask_hits += 1
+            return self._masks[key]
+        self.mask_misses += 1
+
+        catalog = Catalog.from_biscuits(biscuits)
+        mask = tolerance_mask(self.defects, roll_size, catalog.sizes,
+                              catalog.tolerance_matrix(self.defects.class_names))
+        self._masks[key] = mask
+        return mask
+
+    # tells for each of the starts if biscuit can start there, see feasibility_mask
+    def valid_starts(self, biscuit, starts, roll_size):
+        ends = starts + biscuit.size
+        valid = ends <= roll_size
+        for defect_type, xs in self.xs_by_class.items():
+            if defect_type not in biscuit.tolerance:
+                raise ValueError('Defects keys are different')
+            counts = np.searchsorted(xs, ends, side='left') - np.searchsorted(xs, starts, side='right')
+            valid &= counts <= biscuit.tolerance[defect_type]
+        return valid
+
+    # index of the defects with the {'x', 'class'} dicts of added and without the ones of removed
+    # the feasibility masks already computed are carried over to the new index: a defect at x only changes
+    # the starts of the biscuits that can contain it, in (x - size, x), so only those are checked again
+    def updated(self, added=(), removed=()):
+        index = DefectIndex(self.defects.updated(added, removed))
+        xs = [float(defect['x']) for defect in list(added) + list(removed)]
+        for key, mask in self._masks.items():
+            roll_size, biscuits = key
+            mask = mask.copy()
+            for i, biscuit in enumerate(biscuits):
+                for x in xs:
+                    lo = min(max(int(np.floor(x)) - biscuit.size, 0), roll_size)
+                    hi = min(max(int(np.ceil(x)) + 1, 0), roll_size)
+                    mask[i, lo:hi] = index.valid_starts(biscuit, np.arange(lo, hi), roll_size)
+            index._masks[key] = mask
+        return index
+
+
+# index of the defects of defects_path, loaded on first use
+def get_defects_index():
+    global _defects_index
+    if _defects_index is None:
+        _defects_index = DefectIndex(load_defects(defects_path))
+    return _defects_index
+
+
+# changes the defects file, the defects will be loaded from it on next use
+def set_defects_path(path):
+    global defects_path, _defects_index
+    defects_path = path
+    _defects_index = None
+
+
+# index of the defects given to a roll or an engine
+# None is the defects of defects_path, the defects can also be a DefectIndex, a Defects,
+# a list of {'x', 'class'} dicts or the path of a csv file
+def as_defects_index(defects):
+    if defects is None:
+        return get_defects_index()
+    if isinstance(defects, DefectIndex):
+        return defects
+    if isinstance(defects, str):
+        return DefectIndex(load_defects(defects))
+    return DefectIndex(defects)
+
+
+# defects_index, defects_list and defect_types are still available as module attributes,
+# they trigger the loading of the defects the first time they are accessed
+def __getattr__(name):
+    if name == 'defects_index':
+        return get_defects_index()
+    if name == 'defects_list':
+        return get_defects_index().defects.to_dicts()
+    if name == 'defect_types':
+        return get_defects_index().defect_types
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 class Biscuit:
@@ -26,8 +163,33 @@ class Biscuit:
         self.value = value
         self.tolerance = tolerance
 
+    # biscuits are shared between rolls (see biscuit_types), copying a roll should not copy its biscuits
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    # for the same reason, the biscuit types are pickled as their index in biscuit_types,
+    # so that a roll sent to an other process still uses the biscuit types of that process
+    def __reduce__(self):
+        if self in biscuit_codes:
+            return get_biscuit_type, (biscuit_codes[self],)
+        return Biscuit, (self.size, self.value, self.tolerance)
+
+    # the defects are counted in a dict of the classes of the tolerance of the biscuit,
+    # a defect of an other class raises a ValueError
     def is_valid(self, defects):
-        defects_sums = self.dict_sums_defects(defects)
+        defects_sums = dict.fromkeys(self.tolerance, 0)
+        for defect in defects:
+            if defect['class'] not in defects_sums:
+                raise ValueError('Defects keys are different')
+            defects_sums[defect['class']] += 1
+        return self.is_valid_counts(defects_sums)
+
+    # same as is_valid, but takes the number of defects of each class directly
+    # (see DefectIndex.count_between)
+    def is_valid_counts(self, defects_sums):
         if defects_sums.keys() != self.tolerance.keys():
             raise ValueError('Defects keys are different')
         for k in defects_sums:
@@ -35,64 +197,119 @@ class Biscuit:
                 return False
         return True
 
-    @staticmethod
-    def dict_sums_defects(defects):
-        defects_sums = {defect_type: 0 for defect_type in defect_types}
-        for defect in defects:
-            defect_type = defect['class']
-            defects_sums[defect_type] += 1
 
-        return defects_sums
+# array of different types of biscuit, read from the catalog file (see catalog.load_catalog)
+# the types are sorted from the biggest to the smallest, which the engines that try the biggest biscuit first rely on
+# it will also provide the program with a pointer for each type of biscuit,
+# that will allow to access biscuit characteristics without copying the instance
+biscuit_types = sorted(load_catalog().biscuits(Biscuit), key=lambda biscuit: -biscuit.size)
 
+# index of each biscuit type in biscuit_types, which is also its row in the feasibility masks
+biscuit_codes = {biscuit_type: code for code, biscuit_type in enumerate(biscuit_types)}
 
-# array of different types of biscuit
-# this array will contain the 4 types of biscuit
-# it will also provide the program with 4 pointers (each for each type of biscuit),
-# that will allow to access biscuit characteristics without copying the instance
-biscuit_types = [
-    Biscuit(8, 12, {'a': 5, 'b': 4, 'c': 4}),
-    Biscuit(5, 8, {'a': 2, 'b': 3, 'c': 2}),
-    Biscuit(4, 6, {'a': 4, 'b': 2, 'c': 3}),
-    Biscuit(2, 1, {'a': 1, 'b': 2, 'c': 1})
-]
+
+def get_biscuit_type(code):
+    return biscuit_types[code]
+
+
+# size and value of each biscuit code
+# the last entry is an empty unit of dough, so the code -1 can be used for the gaps of a roll
+code_sizes = np.array([biscuit_type.size for biscuit_type in biscuit_types] + [1])
+code_values = np.array([biscuit_type.value for biscuit_type in biscuit_types] + [0])
 
 
+# The biscuits of a roll are a persistent sequence (see persistent.ChunkedList): the methods that change the roll
+# replace its sequence by a new one, that shares all the chunks they do not touch with the old one.
+# So copy() is cheap, and a copy can be changed without changing the roll it was copied from
 class Roll:
-    def __init__(self, roll_size=500):
+    # defects are the defects of this roll (see as_defects_index), by default the ones of defects_path
+    def __init__(self, roll_size=500, defects=None):
         self.roll_size = roll_size
-        self._biscuits = []
+        self.defects = None if defects is None else as_defects_index(defects)
+        self._sequence = ChunkedList()
+        # biscuits appended since the sequence was last read: the builders of rolls append them one by one,
+        # and each append to the persistent sequence would copy its list of chunks, so they are added at once
+        self._appended = []
+        # incremental evaluator of the roll, built on demand by evaluator()
+        # the methods that change one biscuit keep it up to date, the others discard it
+        self._evaluator = None
 
     def __str__(self):
         return str(self._biscuits)
 
+    @property
+    def _biscuits(self):
+        if self._appended:
+            self._sequence = self._sequence.extend(self._appended)
+            self._appended = []
+        return self._sequence
+
+    @_biscuits.setter
+    def _biscuits(self, biscuits):
+        self._sequence = biscuits
+        self._appended = []
+
+    # new roll with the same biscuits, that shares them and the state of the evaluator with this one
+    def copy(self):
+        roll = Roll(self.roll_size, self.defects)
+        roll._biscuits = self._biscuits
+        roll._evaluator = None if self._evaluator is None else self._evaluator.copy()
+        return roll
+
+    # a deep copy of a roll is the same as its copy: the biscuits and the defects are shared anyway
+    def __copy__(self):
+        return self.copy()
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
     def get_biscuits(self, index1=0, index2=None):
         return self._biscuits[index1:index2]
 
     def insert_biscuits(self, index, biscuit):
-        self._biscuits.insert(index, biscuit)
+        self._biscuits = self._biscuits.insert(index, biscuit)
+        if self._evaluator is not None:
+            self._evaluator.insert(index, biscuit)
+
+    # replace the biscuit at index, the biscuit can be None to leave an empty unit
+    def replace_biscuit(self, index, biscuit):
+        self._biscuits = self._biscuits.set(index, biscuit)
+        if self._evaluator is not None:
+            self._evaluator.replace(index, biscuit)
+
+    def remove_biscuit(self, index):
+        biscuit = self._biscuits[index]
+        self._biscuits = self._biscuits.delete(index)
+        if self._evaluator is not None:
+            self._evaluator.delete(index)
+        return biscuit
 
     def append_biscuits(self, biscuits):
+        self._evaluator = None
         if isinstance(biscuits, list):
-            self._biscuits += biscuits
+            self._appended.extend(biscuits)
         elif isinstance(biscuits, Biscuit) or isinstance(biscuits, dict):
-            self._biscuits.append(biscuits)
+            self._appended.append(biscuits)
         else:
             raise ValueError(f'Biscuits should be a list or a Biscuit, biscuit is {biscuits.__class__.__name__}')
 
     def invert_biscuits(self, index1, index2, copy=False):
         if copy:
-            roll_copy = deepcopy(self)
+            roll_copy = self.copy()
             roll_copy.invert_biscuits(index1, index2)
             return roll_copy
-        self._biscuits[index1], self._biscuits[index2] = self._biscuits[index2], self._biscuits[index1]
+        biscuit1, biscuit2 = self._biscuits[index1], self._biscuits[index2]
+        self.replace_biscuit(index1, biscuit2)
+        self.replace_biscuit(index2, biscuit1)
 
     def mix_biscuits(self, copy=False):
+        # the biscuits are shared by all the rolls, a list of them is enough to shuffle them
+        new_biscuits = self._biscuits.tolist()
+        rng.shuffle(new_biscuits)
         if copy:
-            new_biscuits = deepcopy(self._biscuits)
-            rng.shuffle(new_biscuits)
             return new_biscuits
-        else:
-            return rng.shuffle(self._biscuits)
+        self._evaluator = None
+        self._biscuits = ChunkedList(new_biscuits)
 
     # returns the price of all the biscuits in the roll to be sold
     # is the function to be optimized so the company can fit the arrangement of biscuits that will maximize
@@ -111,18 +328,20 @@ class Roll:
 
     # function that fills the roll randomly
     def fill_roll_random(self, check_biscuit_valid=True):
-        # list of random integers between 0 and 3
-        # the list goes from 0 to 250, as the smallest biscuit is of size 2 and the roll length is 500
-        integers = rng.integers(0, 4, size=self.roll_size // 2)
+        # list of random biscuit types, one per biscuit the roll can hold at most:
+        # the roll length divided by the size of the smallest biscuit type
+        smallest = min(biscuit.size for biscuit in biscuit_types)
+        integers = rng.integers(0, len(biscuit_types), size=self.roll_size // smallest)
         # the position cursor keeps track of the length of the all the biscuits currently on the roll
         position = 0
+        mask = self.feasibility()
         for i in integers:
             new_biscuit = biscuit_types[i]
-            defects_in_range = Roll.get_defects_between(position, position + new_biscuit.size)
             # if the biscuit spills over the roll, we try to find a biscuit that fits at the end among the biscuit types
             if position + new_biscuit.size >= self.roll_size:
                 if check_biscuit_valid:
-                    best_fit_biscuit = Roll.replace_defect_biscuit(position, size_limit=self.roll_size - position)
+                    best_fit_biscuit = Roll.replace_defect_biscuit(position, size_limit=self.roll_size - position,
+                                                                   mask=mask)
                     self.append_biscuits([best_fit_biscuit])
                     if best_fit_biscuit is not None:
                         position += best_fit_biscuit.size
@@ -134,13 +353,13 @@ class Roll:
 
             # if there's room for the biscuit, we add it to the roll and check its defects
             if check_biscuit_valid:
-                if new_biscuit.is_valid(defects_in_range):
+                if mask[i, position]:
                     self.append_biscuits(new_biscuit)
                     position += new_biscuit.size
                 # if the biscuit is not valid, we try to add an other biscuit from the biggest to the smallest
                 # the array of biscuits is already sorted, so we can directly iterate over them
                 else:
-                    best_fit_biscuit = Roll.replace_defect_biscuit(position)
+                    best_fit_biscuit = Roll.replace_defect_biscuit(position, mask=mask)
                     self.append_biscuits([best_fit_biscuit])
                     if best_fit_biscuit is not None:
                         position += best_fit_biscuit.size
@@ -153,16 +372,17 @@ class Roll:
     # Checks if the all the biscuits in the roll satisfy their constraint of defects
     def check_biscuits_tolerance(self):
         position = 0
+        mask = self.feasibility()
         for i, biscuit in enumerate(self._biscuits):
             # if no biscuit is at position, advance and go to next iteration
             if biscuit is None:
                 position += 1
                 continue
-            # else we have to retrieve the defects present on the biscuit from the defects_list
-            # and check if the biscuit is valid
-            defects_in_range = Roll.get_defects_between(position, position + biscuit.size)
-            if not biscuit.is_valid(defects_in_range):
+            # else we check in the feasibility mask if the biscuit is valid at this position
+            # a biscuit that starts after the end of the roll is not valid either
+            if position >= self.roll_size or not mask[biscuit_codes[biscuit], position]:
                 return False
+            position += biscuit.size
         return True
 
     # counts the number of biscuit of each type in the roll
@@ -175,27 +395,54 @@ class Roll:
         return biscuits_counts
 
     # try to replace defect biscuit with an other biscuit
+    # if the feasibility mask of the roll is given, it is used instead of counting the defects
     @staticmethod
-    def replace_defect_biscuit(position, size_limit=-1):
-        for biscuit_type in biscuit_types:
-            defects_in_range = Roll.get_defects_between(position, position + biscuit_type.size)
-            if biscuit_type.is_valid(defects_in_range) and biscuit_type.size < size_limit:
+    def replace_defect_biscuit(position, size_limit=-1, mask=None):
+        for code, biscuit_type in enumerate(biscuit_types):
+            if mask is not None:
+                is_valid = mask[code, position]
+            else:
+                is_valid = biscuit_type.is_valid_counts(
+                    Roll.count_defects_between(position, position + biscuit_type.size))
+            if is_valid and biscuit_type.size < size_limit:
                 return biscuit_type
         return None
 
+    # boolean matrix of shape [len(biscuit_types), roll_size]
+    # tells for each biscuit type and each position if the biscuit can start there, see DefectIndex.feasibility_mask
+    def feasibility(self):
+        return self.defects_index().feasibility_mask(self.roll_size)
+
+    def defects_index(self):
+        return as_defects_index(self.defects)
+
+    # incremental evaluator of the roll, see RollEvaluator
+    def evaluator(self):
+        if self._evaluator is None:
+            self._evaluator = RollEvaluator(RollLayout.from_roll(self))
+        return self._evaluator
+
+    # key of the biscuits of the roll, equal for the rolls with the same biscuits at the same places
+    # it is read from the layout of the evaluator, which every change of the roll updates or discards,
+    # so the key of a roll changed in place is always the key of its new biscuits
+    def layout_key(self):
+        return self.evaluator().layout.key()
+
     # get defects on the roll between two positions
     @staticmethod
     def get_defects_between(a, b):
-        return [defect for defect in defects_list if a < defect['x'] < b]
+        return get_defects_index().between(a, b)
 
-    # not implemented and not used
-    # get defects on the roll between two positions
-    # the idea was to store the position in a variable and to return a generator that would keep the position as a value
-    # so the function would skip all the positions
-    # that would have an x value before the current position of the generator and retrieves defects faster
+    # get defects on the roll between two positions, as a generator
+    # the index bisects directly to the first defect after a, so all the defects before it are skipped
     @staticmethod
     def get_defects_between_iter(a, b):
-        raise NotImplementedError
+        return get_defects_index().iter_between(a, b)
+
+    # get the number of defects of each class on the roll between two positions
+    @staticmethod
+    def count_defects_between(a, b):
+        return get_defects_index().count_between(a, b)
 
     # returns a roll with options
     # not used
@@ -207,6 +454,196 @@ class Roll:
             return r
 
 
+# compact representation of the biscuits of a roll
+# each biscuit is stored as a type code (its index in biscuit_types, -1 for an empty unit of dough)
+# and its start offset on the roll, in two int arrays, so there is no Python object per biscuit
+# and the price, length and counts are computed with vectorized operations
+class RollLayout:
+    __slots__ = ('roll_size', 'codes', 'starts', 'defects')
+
+    def __init__(self, roll_size, codes, starts=None, defects=None):
+        self.roll_size = roll_size
+        self.defects = defects
+        self.codes = np.asarray(codes, dtype=np.int16)
+        # if the start offsets are not given, the biscuits are placed one after the other
+        if starts is None:
+            ends = np.cumsum(code_sizes[self.codes])
+            starts = ends - code_sizes[self.codes]
+        self.starts = np.asarray(starts, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __str__(self):
+        return str(list(zip(self.codes.tolist(), self.starts.tolist())))
+
+    # hashable key of the biscuits of the layout, see Roll.layout_key
+    def key(self):
+        return self.roll_size, self.codes.tobytes(), self.starts.tobytes()
+
+    # builds the layout of a roll
+    # the roll can hold biscuits, None for an empty unit, or {'start', 'end', 'biscuit'} dicts
+    @staticmethod
+    def from_roll(roll):
+        codes = []
+        starts = []
+        position = 0
+        for biscuit in roll.get_biscuits():
+            if biscuit is None:
+                codes.append(-1)
+                starts.append(position)
+                position += 1
+            elif isinstance(biscuit, dict):
+                codes.append(biscuit_codes[biscuit['biscuit']])
+                starts.append(biscuit['start'])
+                position = biscuit['start'] + biscuit['biscuit'].size
+            else:
+                codes.append(biscuit_codes[biscuit])
+                starts.append(position)
+                position += biscuit.size
+        return RollLayout(roll.roll_size, codes, starts, roll.defects)
+
+    # builds the layout of {'start', 'end', 'biscuit'} placements, sorted by start, made by any engine:
+    # the biscuits are matched to biscuit_types by their size, so placements of biscuits_clement can be used
+    @staticmethod
+    def from_placements(roll_size, placements, defects=None):
+        codes_by_size = {biscuit_type.size: code for code, biscuit_type in enumerate(biscuit_types)}
+        codes = [codes_by_size[placement['biscuit'].size] for placement in placements]
+        starts = [placement['start'] for placement in placements]
+        return RollLayout(roll_size, codes, starts, defects)
+
+    # builds back a Roll, with None for every unit of dough left empty between two biscuits
+    def to_roll(self):
+        roll = Roll(self.roll_size, self.defects)
+        position = 0
+        for code, start in zip(self.codes.tolist(), self.starts.tolist()):
+            biscuit = biscuit_types[code] if code >= 0 else None
+            roll.append_biscuits([None] * (start - position) + [biscuit])
+            position = start + int(code_sizes[code])
+        return roll
+
+    def total_price(self):
+        return int(code_values[self.codes].sum())
+
+    def number_of_biscuits(self):
+        return int(np.count_nonzero(self.codes >= 0))
+
+    def dough_length(self):
+        return int(code_sizes[self.codes[self.codes >= 0]].sum())
+
+    # same as Roll.biscuit_type_count, a dict with biscuit size as key and the number of their occurrences
+    def biscuit_type_count(self):
+        counts = np.bincount(self.codes[self.codes >= 0], minlength=len(biscuit_types))
+        return {biscuit_type.size: int(count) for biscuit_type, count in zip(biscuit_types, counts)}
+
+    # same as Roll.check_biscuits_tolerance, in one lookup of the feasibility mask for all the biscuits
+    def check_biscuits_tolerance(self):
+        biscuits = self.codes >= 0
+        codes = self.codes[biscuits]
+        starts = self.starts[biscuits]
+        if np.any(starts >= self.roll_size):
+            return False
+        mask = as_defects_index(self.defects).feasibility_mask(self.roll_size)
+        return bool(np.all(mask[codes, starts]))
+
+
+# keeps the price and the validity of a roll layout up to date when one biscuit is replaced, inserted or deleted
+# the validity of each biscuit is stored, so a change only checks the biscuits it affects:
+# the changed biscuit if its size did not change,
+# otherwise also the biscuits after it, whose start offsets are shifted with one vectorized operation
+class RollEvaluator:
+    def __init__(self, layout):
+        self.layout = layout
+        self.mask = as_defects_index(layout.defects).feasibility_mask(layout.roll_size)
+        self.valid = self._check(layout.codes, layout.starts)
+        self.n_invalid = int(np.count_nonzero(~self.valid))
+        self.price = layout.total_price()
+
+    # the feasibility mask is shared by all the evaluators of the same roll size, it is not copied with them
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['mask']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.mask = as_defects_index(self.layout.defects).feasibility_mask(self.layout.roll_size)
+
+    # the arrays of the evaluator and of its layout are never changed in place, the changes replace them:
+    # so a copy shares them with the evaluator it was copied from, until one of the two changes.
+    # A change still copies the arrays it changes, O(n) but in a single memcpy: the starts after a biscuit whose
+    # size changed have to be shifted anyway, only the biscuits of the roll are changed in O(log n) (see ChunkedList)
+    def copy(self):
+        evaluator = RollEvaluator.__new__(RollEvaluator)
+        evaluator.__dict__.update(self.__dict__)
+        layout = self.layout
+        evaluator.layout = RollLayout(layout.roll_size, layout.codes, layout.starts, layout.defects)
+        return evaluator
+
+    def is_valid(self):
+        return self.n_invalid == 0
+
+    # validity of biscuits given by their codes and starts
+    # empty units are always valid, biscuits have to be on the roll and within their tolerance
+    def _check(self, codes, starts):
+        roll_size = self.layout.roll_size
+        inside = starts + code_sizes[codes] <= roll_size
+        within_tolerance = self.mask[np.maximum(codes, 0), np.minimum(starts, roll_size - 1)]
+        return (codes < 0) | (inside & within_tolerance)
+
+    # checks again the biscuits from index, up to the end of the roll if the biscuits after index have moved
+    def _update(self, index, moved):
+        window = slice(index, None) if moved else slice(index, index + 1)
+        valid = self._check(self.layout.codes[window], self.layout.starts[window])
+        self.n_invalid += int(np.count_nonzero(~valid)) - int(np.count_nonzero(~self.valid[window]))
+        self.valid = self.valid.copy()
+        self.valid[window] = valid
+
+    def replace(self, index, biscuit):
+        layout = self.layout
+        index = range(len(layout))[index]
+        code = -1 if biscuit is None else biscuit_codes[biscuit]
+        old_code = layout.codes[index]
+        shift = int(code_sizes[code] - code_sizes[old_code])
+        self.price += int(code_values[code] - code_values[old_code])
+        layout.codes = layout.codes.copy()
+        layout.codes[index] = code
+        if shift != 0:
+            layout.starts = layout.starts.copy()
+            layout.starts[index + 1:] += shift
+        self._update(index, shift != 0)
+
+    def insert(self, index, biscuit):
+        layout = self.layout
+        # same index semantics as list.insert
+        index = min(max(index + len(layout) if index < 0 else index, 0), len(layout))
+        code = -1 if biscuit is None else biscuit_codes[biscuit]
+        if index < len(layout):
+            start = layout.starts[index]
+        elif len(layout) > 0:
+            start = layout.starts[-1] + code_sizes[layout.codes[-1]]
+        else:
+            start = 0
+        layout.codes = np.insert(layout.codes, index, code)
+        layout.starts = np.insert(layout.starts, index, start)
+        layout.starts[index + 1:] += code_sizes[code]
+        self.valid = np.insert(self.valid, index, True)
+        self.price += int(code_values[code])
+        self._update(index, True)
+
+    def delete(self, index):
+        layout = self.layout
+        index = range(len(layout))[index]
+        code = layout.codes[index]
+        self.n_invalid -= int(not self.valid[index])
+        self.price -= int(code_values[code])
+        layout.codes = np.delete(layout.codes, index)
+        layout.starts = np.delete(layout.starts, index)
+        self.valid = np.delete(self.valid, index)
+        layout.starts[index:] -= code_sizes[code]
+        self._update(index, True)
+
+
 if __name__ == '__main__':
     roll = Roll(500)
     roll.fill_roll_random()
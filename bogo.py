@@ -1,16 +1,103 @@
-from biscuits_racel import Roll
+from itertools import count
+import numpy as np
+from biscuits_racel import Roll, RollLayout, biscuit_types, code_sizes, code_values, as_defects_index
+from search_control import check_bounded
 
 
-def bogo(max_iter):
+# control is an optional search_control.SearchControl, checked after each roll,
+# with a bounded control (see SearchControl.is_bounded) max_iter can be None:
+# the search runs until the control stops it
+def bogo(max_iter, roll_size=500, defects=None, control=None):
+    check_bounded(max_iter, control)
+    defects = as_defects_index(defects)
     best_roll = None
     best_score = float('-inf')
-    for _ in range(max_iter):
-        roll = Roll(500)
+    if control is not None:
+        control.start()
+    for _ in count() if max_iter is None else range(max_iter):
+        roll = Roll(roll_size, defects)
         roll.fill_roll_random(check_biscuit_valid=True)
         v = roll.total_price()
         if v > best_score:
             best_roll = roll
             best_score = v
+        if control is not None:
+            control.update(best_score, best_roll)
+            if control.should_stop():
+                break
+
+    return best_roll, best_score
+
+
+# generates n random valid rolls at once, in the same way as Roll.fill_roll_random,
+# but with all the rolls advancing together, one biscuit per step
+# returns a 2D array of biscuit codes (one row per roll, -1 for an empty unit and after the end of the roll)
+# and the number of biscuits and empty units of each roll
+def random_layouts(n, roll_size=500, rng=None, defects=None):
+    if rng is None:
+        rng = np.random.default_rng()
+    n_types = len(biscuit_types)
+    mask = as_defects_index(defects).feasibility_mask(roll_size)
+    positions_range = np.arange(roll_size)
+
+    # the fixups are resolved once per position:
+    # first_fit[position] is the first biscuit type, from the biggest to the smallest,
+    # that is valid at position and ends before the end of the roll, -1 (an empty unit) if there is none
+    fits = mask & (code_sizes[:n_types, None] < roll_size - positions_range)
+    first_fit = np.where(fits.any(axis=0), fits.argmax(axis=0), -1)
+
+    # a roll cannot hold more random biscuits than roll_size divided by the size of the smallest biscuit type
+    steps = roll_size // int(code_sizes[:n_types].min()) + 1
+    codes = np.full((n, steps), -1, dtype=np.int16)
+    lengths = np.zeros(n, dtype=np.int32)
+    positions = np.zeros(n, dtype=np.int64)
+    active = np.ones(n, dtype=bool)
+    for step in range(steps):
+        rows = np.flatnonzero(active)
+        if len(rows) == 0:
+            break
+        position = positions[rows]
+        drawn = rng.integers(0, n_types, size=len(rows))
+        # a biscuit that spills over the roll is replaced by the first fit, and the roll is done
+        spill = position + code_sizes[drawn] >= roll_size
+        # an invalid biscuit is replaced by the first fit too
+        valid = mask[drawn, position]
+        chosen = np.where(valid & ~spill, drawn, first_fit[position])
+        codes[rows, step] = chosen
+        positions[rows] = position + code_sizes[chosen]
+        lengths[rows] += 1
+        active[rows[spill]] = False
+
+    return codes, lengths
+
+
+# price of each roll of a batch of codes, in one vectorized pass
+def score_layouts(codes):
+    return code_values[codes].sum(axis=1)
+
+
+# same as bogo, but the rolls are generated and scored by batches of batch_size
+# the control is checked after each batch
+def bogo_batch(max_iter, roll_size=500, batch_size=10000, seed=None, defects=None, control=None):
+    check_bounded(max_iter, control)
+    defects = as_defects_index(defects)
+    rng = np.random.default_rng(seed)
+    best_roll = None
+    best_score = float('-inf')
+    if control is not None:
+        control.start()
+    for batch_start in count(0, batch_size) if max_iter is None else range(0, max_iter, batch_size):
+        n = batch_size if max_iter is None else min(batch_size, max_iter - batch_start)
+        codes, lengths = random_layouts(n, roll_size, rng, defects)
+        scores = score_layouts(codes)
+        best = int(np.argmax(scores))
+        if scores[best] > best_score:
+            best_roll = RollLayout(roll_size, codes[best, :lengths[best]], defects=defects).to_roll()
+            best_score = int(scores[best])
+        if control is not None:
+            control.update(best_score, best_roll)
+            if control.should_stop():
+                break
 
     return best_roll, best_score
 
@@ -18,4 +105,5 @@ def bogo(max_iter):
 if __name__ == '__main__':
     best_r, best_s = bogo(500)
     print(f'Best price is : {best_s}, best number of biscuits is :{best_r.number_of_biscuits()}')
+    best_r, best_s = bogo_batch(100000)
     print(f'Best price is : {best_s}, best number of biscuits is :{best_r.number_of_biscuits()}')
@@ -0,0 +1,128 @@
+import time
+from biscuits_clement import biscuit_types, get_defects, Roll, feasibility_mask
+from constraints import fit_and_cover, is_possible
+from dynamic import solve_table
+
+
+# Exact search by branch and bound, with side constraints that the dynamic programming cannot express:
+# min_counts[i] is the least number of biscuits[i] on the roll,
+# and max_consecutive the most biscuits of the same type one after the other (empty dough does not break a run).
+# The roll is filled from left to right: at each position the search places a biscuit that is valid there,
+# or skips to the next position where a biscuit is valid. The search keeps its own stack instead of recursing,
+# so its depth is not limited by the size of the roll.
+#
+# The bound of a node is the value of its biscuits plus the best value of the rest of the roll
+# without the side constraints, which the dynamic programming table gives for every position.
+# It is never above the value-per-length bound (the best value density times the dough left), and much closer
+# to the real value on rolls with defects. A node is pruned when
+#  - its bound is not above the best roll found so far (the incumbent),
+#  - the biscuits its min_counts still need do not fit in the rest of the roll,
+#  - the same state (position, counts still needed, type and length of the last run) was already reached
+#    with at least the same value.
+#
+# node_limit and time_limit (in seconds) stop the search early. Returns the value and the placements
+# of the best roll found, as {'start', 'end', 'biscuit'} dicts, and the proven gap: how much better than it
+# the best roll can be, 0 if the search is complete. The value and the placements are None if no roll that
+# satisfies the constraints was found.
+def branch_and_bound(roll_size=500, biscuits=None, defects=None, min_counts=None, max_consecutive=None,
+                     node_limit=None, time_limit=None):
+    if biscuits is None:
+        biscuits = sorted(biscuit_types, key=lambda b: -b.value)
+    if min_counts is None:
+        min_counts = [0] * len(biscuits)
+    min_counts = tuple(min_counts)
+    sizes = [biscuit.size for biscuit in biscuits]
+    values = [biscuit.value for biscuit in biscuits]
+    deadline = None if time_limit is None else time.perf_counter() + time_limit
+
+    mask = feasibility_mask(roll_size, biscuits, defects)
+    valid_starts = mask.tolist()
+    best_values, _ = solve_table(mask, biscuits)
+    # next_start[position] is the first position at or after position where a biscuit is valid
+    next_start = [roll_size] * (roll_size + 1)
+    for position in range(roll_size - 1, -1, -1):
+        valid = any(valid_starts[i][position] for i in range(len(biscuits)))
+        next_start[position] = position if valid else next_start[position + 1]
+    # the bounds of the biscuits min_counts still needs, see constraints.is_possible
+    fit, cover = fit_and_cover(valid_starts, sizes, roll_size)
+
+    # the children of a node, the most promising first: (bound, position, needed, last, run, value, placement)
+    # needed[i] is the number of biscuits[i] that min_counts still needs
+    def children(position, needed, last, run, value):
+        nodes = []
+        for i, biscuit in enumerate(biscuits):
+            if not valid_starts[i][position] or (i == last and max_consecutive is not None
+                                                  and run >= max_consecutive):
+                continue
+            end = position + sizes[i]
+            child_needed = needed if not needed[i] else needed[:i] + (needed[i] - 1,) + needed[i + 1:]
+            placement = {'start': position, 'end': end, 'biscuit': biscuit}
+            nodes.append((value + values[i] + best_values[end], next_start[end], child_needed, i,
+                          run + 1 if i == last else 1, value + values[i], placement))
+        skip = next_start[position + 1]
+        nodes.append((value + best_values[skip], skip, needed, last, run, value, None))
+        nodes.sort(key=lambda node: -node[0])
+        return nodes
+
+    best_value = None
+    best_arrangement = None
+    # dominance memo: the best value with which each state was reached
+    reached = {}
+    nodes = 0
+    placements = []
+    start = next_start[0]
+    # each frame is the children of a node, and the index of the next child to try
+    # the first frame only holds the root, the empty roll
+    stack = [[[(best_values[start], start, min_counts, None, 0, 0, None)], 0]]
+
+    while stack:
+        if (node_limit is not None and nodes >= node_limit) or \
+                (deadline is not None and nodes % 256 == 0 and time.perf_counter() > deadline):
+            break
+        frame = stack[-1]
+        branches, index = frame
+        # the children are sorted by bound, so once one is pruned by the incumbent, all the next ones are too
+        if index == len(branches) or best_value is not None and branches[index][0] <= best_value:
+            stack.pop()
+            # the frames pushed by a skip have no placement, it is None in placements
+            if placements:
+                placements.pop()
+            continue
+        frame[1] += 1
+
+        child_bound, position, needed, last, run, value, placement = branches[index]
+        if not is_possible(fit, cover, sizes, position, needed):
+            continue
+        nodes += 1
+        if position >= roll_size:
+            if not any(needed):
+                best_value = value
+                best_arrangement = [p for p in placements if p is not None]
+                if placement is not None:
+                    best_arrangement.append(placement)
+            continue
+        state = (position, needed, last, run)
+        if reached.get(state, -1) >= value:
+            continue
+        reached[state] = value
+        placements.append(placement)
+        stack.append([children(position, needed, last, run, value), 0])
+
+    if best_value is None:
+        return None, None, None
+    # the children left in the stack are the nodes the search did not explore, none can beat their bound
+    upper_bound = max([branches[index][0] for branches, index in stack if index < len(branches)], default=0)
+    return best_value, best_arrangement, max(upper_bound - best_value, 0)
+
+
+if __name__ == '__main__':
+    # the best roll with at least 10 biscuits of each type, and no more than 5 biscuits of a type in a row
+    sorted_biscuits = sorted(biscuit_types, key=lambda b: -b.value)
+    total_value, arrangement, gap = branch_and_bound(500, sorted_biscuits, get_defects(),
+                                                     min_counts=[10] * len(sorted_biscuits), max_consecutive=5,
+                                                     time_limit=60)
+
+    best_roll = Roll(roll_size=500)
+    best_roll.set_biscuits(arrangement)
+    print(f"The total value of the best roll is: {best_roll.total_value()}, proven gap: {gap}")
+    print(f"The biscuits counts of the best roll is: {best_roll.biscuit_type_count()}")
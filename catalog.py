@@ -0,0 +1,142 @@
+import csv
+import os
+from collections import OrderedDict
+import numpy as np
+
+# default catalog file, next to this module, it can be changed with the BISCUITS_CATALOG environment variable
+DEFAULT_CATALOG_PATH = os.environ.get(
+    'BISCUITS_CATALOG',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'catalog.csv')
+)
+
+
+# catalog of the biscuit types (the products) that can be cut in the dough
+# each type has a name, a size, a value and a tolerance for each defect class,
+# kept as arrays: sizes and values of shape [n_types], and tolerances of shape [n_types, n_classes],
+# tolerances[i, j] being the tolerance of type i for the defects of class class_names[j].
+# What a tolerance means is up to the model: biscuits_racel allows up to tolerance defects strictly inside a biscuit,
+# biscuits_clement strictly less than tolerance defects in [start, end)
+class Catalog:
+    def __init__(self, names, sizes, values, tolerances, class_names):
+        self.names = list(names)
+        self.sizes = np.asarray(sizes, dtype=np.int64)
+        self.values = np.asarray(values, dtype=np.int64)
+        self.tolerances = np.asarray(tolerances, dtype=np.int64).reshape(len(self.names), len(class_names))
+        self.class_names = list(class_names)
+
+    def __len__(self):
+        return len(self.names)
+
+    # tolerances of the types for the defect classes class_names, in that order
+    def tolerance_matrix(self, class_names):
+        columns = {name: j for j, name in enumerate(self.class_names)}
+        if any(name not in columns for name in class_names):
+            raise ValueError('Defects keys are different')
+        return self.tolerances[:, [columns[name] for name in class_names]]
+
+    # tolerance dict of type i, the format of Biscuit.tolerance
+    def tolerance(self, i):
+        return dict(zip(self.class_names, self.tolerances[i].tolist()))
+
+    # builds an object for each type with biscuit_class(size, value, tolerance), the Biscuit of a model
+    def biscuits(self, biscuit_class):
+        return [
+            biscuit_class(size, value, self.tolerance(i))
+            for i, (size, value) in enumerate(zip(self.sizes.tolist(), self.values.tolist()))
+        ]
+
+    # catalog of biscuit objects with a size, a value and a tolerance dict
+    # the catalog of the same biscuits (by their sizes, values and tolerances) is only compiled once
+    @staticmethod
+    def from_biscuits(biscuits):
+        key = tuple((biscuit.size, biscuit.value, tuple(sorted(biscuit.tolerance.items()))) for biscuit in biscuits)
+        if key in _compiled:
+            _compiled.move_to_end(key)
+            return _compiled[key]
+        class_names = sorted(set().union(*(biscuit.tolerance for biscuit in biscuits)))
+        for biscuit in biscuits:
+            if biscuit.tolerance.keys() != set(class_names):
+                raise ValueError('Defects keys are different')
+        catalog = Catalog(
+            [f'{biscuit.size}x{biscuit.value}' for biscuit in biscuits],
+            [biscuit.size for biscuit in biscuits],
+            [biscuit.value for biscuit in biscuits],
+            [[biscuit.tolerance[name] for name in class_names] for biscuit in biscuits],
+            class_names
+        )
+        _compiled[key] = catalog
+        if len(_compiled) > compiled_cache_size:
+            _compiled.popitem(last=False)
+        return catalog
+
+
+# catalogs of the lists of biscuits already compiled, by their contents, the least recently used first
+_compiled = OrderedDict()
+compiled_cache_size = 64
+
+
+# reads a catalog csv file, with the columns name, size and value, and a column per defect class
+# holding the tolerances of the types for it
+def read_catalog(path):
+    with open(path, 'r', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        columns = {name: i for i, name in enumerate(header)}
+        class_columns = [i for i, name in enumerate(header) if name not in ('name', 'size', 'value')]
+        names, sizes, values, tolerances = [], [], [], []
+        for row in reader:
+            if not row:
+                continue
+            names.append(row[columns['name']])
+            sizes.append(int(row[columns['size']]))
+            values.append(int(row[columns['value']]))
+            tolerances.append([int(row[i]) for i in class_columns])
+    return Catalog(names, sizes, values, np.array(tolerances, dtype=np.int64).reshape(len(names), len(class_columns)),
+                   [header[i] for i in class_columns])
+
+
+def load_catalog(path=None):
+    if path is None:
+        path = DEFAULT_CATALOG_PATH
+    return read_catalog(path)
+
+
+# number of defects of each class before each unit of the roll, of shape [n_classes, roll_size + 1]
+# before[j, unit] counts the defects of class j at x < unit, and after[j, unit] the ones at x <= unit
+def defects_before(defects, roll_size):
+    units = np.arange(roll_size + 1)
+    xs_by_class = defects.xs_by_class()
+    before = np.empty((len(xs_by_class), roll_size + 1), dtype=np.int64)
+    after = np.empty((len(xs_by_class), roll_size + 1), dtype=np.int64)
+    for j, xs in enumerate(xs_by_class.values()):
+        before[j] = np.searchsorted(xs, units, side='left')
+        after[j] = np.searchsorted(xs, units, side='right')
+    return before, after
+
+
+# boolean matrix of shape [n_types, roll_size], mask[i, position] is True if type i can start at position:
+# it fits on the roll, and the number of defects of each class under it is at most max_counts[i, class]
+# (max_counts has a column per class of defects, in the order of defects.class_names).
+# With inside, the defects under a biscuit are the ones strictly inside it (biscuits_racel),
+# otherwise the ones in [start, end) (biscuits_clement).
+# The types with the same size and the same max counts share their row, and for each size and class
+# the rows are compared to the counts of all the positions at once: the cost grows with the number of
+# different rows, not with the number of dict operations
+def tolerance_mask(defects, roll_size, sizes, max_counts, inside=True):
+    sizes = np.asarray(sizes, dtype=np.int64)
+    max_counts = np.asarray(max_counts, dtype=np.int64).reshape(len(sizes), -1)
+    rows, row_of_type = np.unique(np.column_stack((sizes, max_counts)), axis=0, return_inverse=True)
+    row_of_type = row_of_type.reshape(-1)
+
+    before, after = defects_before(defects, roll_size)
+    starts = np.arange(roll_size)
+    mask = np.zeros((len(rows), roll_size), dtype=bool)
+    for size in np.unique(rows[:, 0]).tolist():
+        same_size = np.flatnonzero(rows[:, 0] == size)
+        fits = starts[:roll_size - size + 1] if size <= roll_size else starts[:0]
+        valid = np.ones((len(same_size), len(fits)), dtype=bool)
+        for j in range(max_counts.shape[1]):
+            counts = before[j, fits + size] - (after[j, fits] if inside else before[j, fits])
+            valid &= counts[None, :] <= rows[same_size, 1 + j, None]
+        mask[same_size, :len(fits)] = valid
+    return mask[row_of_type]
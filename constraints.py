@@ -0,0 +1,136 @@
+import numpy as np
+from biscuits_clement import biscuit_types, feasibility_mask
+
+
+# fit[code][position] is the most biscuits of type code that fit after position, without the other types,
+# and cover[position] the most units that biscuits of any type can cover after position
+# valid[code][position] tells if the biscuits of type code, of size sizes[code], are valid at position
+# the tables are shared by the exact engines that place biscuits from left to right (see branch_and_bound)
+def fit_and_cover(valid, sizes, roll_size):
+    fit = [[0] * (roll_size + 1) for _ in sizes]
+    cover = [0] * (roll_size + 1)
+    for position in range(roll_size - 1, -1, -1):
+        best_cover = cover[position + 1]
+        for code, size in enumerate(sizes):
+            if valid[code][position]:
+                fit[code][position] = fit[code][position + size] + 1
+                best_cover = max(best_cover, cover[position + size] + size)
+            else:
+                fit[code][position] = fit[code][position + 1]
+        cover[position] = best_cover
+    return fit, cover
+
+
+# whether counts[code] more biscuits of each type can still fit after cursor, as far as fit and cover can tell:
+# no type has more biscuits than fit after cursor, and they are not longer than the dough they can cover
+def is_possible(fit, cover, sizes, cursor, counts):
+    total = 0
+    for code, count in enumerate(counts):
+        if count:
+            if count > fit[code][cursor]:
+                return False
+            total += count * sizes[code]
+    return total <= cover[cursor]
+
+
+# Constraint engine for the placement of biscuits on a roll (defects in [start, end), like biscuits_clement)
+# The variables are biscuit instances, any number of each type, and their values are their start positions.
+# Two constraints hold between them: the defects under each biscuit are within its tolerance,
+# and the biscuits do not overlap.
+#
+# The tolerance constraint only involves one biscuit, so it is propagated once, when the problem is built:
+# the domain of a type is the row of its feasibility mask, kept as intervals of valid starts,
+# next_start[code][position] being the first valid start at or after position.
+# The no-overlap constraint is solved by placing the biscuits from left to right: at each step the search
+# chooses the type of the next biscuit, and puts it at the first valid start after the previous biscuit.
+# The types are tried by their start, the one that wastes the least dough first.
+# Any solution can be turned into one of those by moving each biscuit as far left as it can go,
+# so the search is complete. The instances of a type are interchangeable, so a state of the search
+# is only the end of the placed biscuits (the cursor) and the number of instances of each type still to place.
+# A state is pruned when
+#  - a type has more biscuits still to place than fit after the cursor, even without the other types,
+#  - the biscuits still to place are longer than the most dough that biscuits can cover after the cursor,
+#  - the same biscuits failed to be placed after a cursor that was not after this one (the nogoods).
+class PlacementProblem:
+    def __init__(self, roll_size=500, biscuits=None, defects=None):
+        if biscuits is None:
+            biscuits = biscuit_types
+        self.roll_size = roll_size
+        self.biscuits = list(biscuits)
+        self.sizes = [biscuit.size for biscuit in self.biscuits]
+        self.counts = [0] * len(self.biscuits)
+        # number of states explored by the last solve,
+        # and nogoods[counts], the first cursor after which the biscuits of counts failed to be placed
+        self.nodes = 0
+        self.nogoods = {}
+
+        mask = feasibility_mask(roll_size, self.biscuits, defects)
+        positions = np.arange(roll_size + 1)
+        self.next_start = []
+        for code in range(len(self.biscuits)):
+            starts = np.flatnonzero(mask[code])
+            # roll_size is the sentinel of a type that has no valid start left
+            self.next_start.append(np.append(starts, roll_size)[np.searchsorted(starts, positions)].tolist())
+
+        self.fit, self.cover = fit_and_cover(mask.tolist(), self.sizes, roll_size)
+
+    # adds count instances of biscuit, which must be one of the types of the problem
+    def add_biscuits(self, biscuit, count=1):
+        for code, biscuit_type in enumerate(self.biscuits):
+            if biscuit_type is biscuit:
+                self.counts[code] += count
+                return
+        raise ValueError('Biscuit is not one of the types of the problem')
+
+    # returns the placements of all the biscuits, as {'start', 'end', 'biscuit'} dicts sorted by start,
+    # or None if they cannot all be placed on the roll
+    def solve(self):
+        self.nodes = 0
+        self.nogoods = {}
+        counts = tuple(self.counts)
+        if not any(counts):
+            return []
+        if not self.is_possible(0, counts):
+            return None
+
+        placements = []
+        # each frame is a state, and the branches of it that are left to try,
+        # the placement that led to the state of a frame is placements[-1]
+        stack = [(0, counts, self.branches(0, counts))]
+        while stack:
+            cursor, counts, branches = stack[-1]
+            branch = next(branches, None)
+            if branch is None:
+                self.nogoods[counts] = min(cursor, self.nogoods.get(counts, cursor))
+                stack.pop()
+                if stack:
+                    placements.pop()
+                continue
+
+            code, start = branch
+            end = start + self.sizes[code]
+            new_counts = counts[:code] + (counts[code] - 1,) + counts[code + 1:]
+            self.nodes += 1
+            placements.append({'start': start, 'end': end, 'biscuit': self.biscuits[code]})
+            if not any(new_counts):
+                return placements
+            if end >= self.nogoods.get(new_counts, end + 1) or not self.is_possible(end, new_counts):
+                placements.pop()
+                continue
+            stack.append((end, new_counts, self.branches(end, new_counts)))
+
+        return None
+
+    # the types that can be placed next and their first valid start after cursor, the earliest start first
+    def branches(self, cursor, counts):
+        starts = [
+            (self.next_start[code][cursor], -self.sizes[code], code)
+            for code, count in enumerate(counts) if count
+        ]
+        for start, _, code in sorted(starts):
+            if start < self.roll_size:
+                yield code, start
+
+    # bounds of the dough needed by the biscuits still to place
+    def is_possible(self, cursor, counts):
+        return is_possible(self.fit, self.cover, self.sizes, cursor, counts)
@@ -0,0 +1,249 @@
+import csv
+import json
+import os
+import tempfile
+from itertools import islice
+import numpy as np
+
+# rows of a defects csv file parsed at once when it is converted to .npy files, see convert_csv
+csv_block_size = 1 << 18
+
+# default defects file, next to this module, it can be changed with the BISCUITS_DEFECTS environment variable
+DEFAULT_DEFECTS_PATH = os.environ.get(
+    'BISCUITS_DEFECTS',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'defects.csv')
+)
+
+
+# defects of a roll, sorted by x
+# the coordinates are a float64 array, and the classes an array of int codes,
+# code i being the class class_names[i]
+class Defects:
+    def __init__(self, xs, classes, class_names):
+        self.xs = xs
+        self.classes = classes
+        self.class_names = list(class_names)
+
+    def __len__(self):
+        return len(self.xs)
+
+    # sorted coordinates of the defects of each class
+    def xs_by_class(self):
+        return {name: self.xs[self.classes == code] for code, name in enumerate(self.class_names)}
+
+    # defects i to j as {'x', 'class'} dicts, the format of the defects of defects.csv
+    def to_dicts(self, i=0, j=None):
+        return [
+            {'x': x, 'class': self.class_names[code]}
+            for x, code in zip(self.xs[i:j].tolist(), self.classes[i:j].tolist())
+        ]
+
+    # new defects, with the {'x', 'class'} dicts of added and without the ones of removed
+    # a removed defect must have the same x and class as a defect of these defects
+    def updated(self, added=(), removed=()):
+        keep = np.ones(len(self.xs), dtype=bool)
+        for defect in removed:
+            x = float(defect['x'])
+            i = int(np.searchsorted(self.xs, x, side='left'))
+            while i < len(self.xs) and self.xs[i] == x and \
+                    (not keep[i] or self.class_names[self.classes[i]] != defect['class']):
+                i += 1
+            if i == len(self.xs) or self.xs[i] != x:
+                raise ValueError(f"Defect {defect} is not in the defects")
+            keep[i] = False
+
+        class_names = list(self.class_names)
+        for defect in added:
+            if defect['class'] not in class_names:
+                class_names.append(defect['class'])
+        codes = {name: code for code, name in enumerate(class_names)}
+        xs = np.concatenate((self.xs[keep], np.array([float(d['x']) for d in added], dtype=np.float64)))
+        classes = np.concatenate((self.classes[keep],
+                                  np.array([codes[d['class']] for d in added], dtype=np.int16)))
+        order = np.argsort(xs, kind='stable')
+        return Defects(xs[order], classes[order].astype(np.int16), class_names)
+
+    # builds the defects from {'x', 'class'} dicts
+    @staticmethod
+    def from_dicts(defects):
+        defects = sorted(defects, key=lambda d: float(d['x']))
+        class_names = sorted(set(defect['class'] for defect in defects))
+        codes = {name: code for code, name in enumerate(class_names)}
+        xs = np.array([float(defect['x']) for defect in defects], dtype=np.float64)
+        classes = np.array([codes[defect['class']] for defect in defects], dtype=np.int16)
+        return Defects(xs, classes, class_names)
+
+
+# reads a defects csv file, with the columns x and class
+def read_csv(path):
+    with open(path, 'r', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        x_column, class_column = header.index('x'), header.index('class')
+        xs = []
+        names = []
+        for row in reader:
+            xs.append(row[x_column])
+            names.append(row[class_column])
+    xs = np.array(xs, dtype=np.float64)
+    class_names, classes = np.unique(np.array(names), return_inverse=True)
+    order = np.argsort(xs, kind='stable')
+    return Defects(xs[order], classes[order].astype(np.int16), class_names.tolist())
+
+
+# reads a defects csv file by blocks of up to block_size rows, yields the xs and the class names of each block
+def read_csv_blocks(path, block_size=None):
+    block_size = csv_block_size if block_size is None else block_size
+    with open(path, 'r', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        x_column, class_column = header.index('x'), header.index('class')
+        while rows := list(islice(reader, block_size)):
+            yield np.array([row[x_column] for row in rows], dtype=np.float64), [row[class_column] for row in rows]
+
+
+# converts a defects csv file to the .npy files of its xs and its classes, without holding all the defects in memory:
+# the blocks of rows are sorted and written to a temporary directory next to the .npy files,
+# then merged into them (see _merge_runs), which are memory-mapped as they are written.
+# The .npy files are written to temporary files that replace them at the end.
+# Returns the class names and the number of defects
+def convert_csv(path, xs_path, classes_path, block_size=None):
+    block_size = csv_block_size if block_size is None else block_size
+    directory = os.path.dirname(os.path.abspath(xs_path))
+    with tempfile.TemporaryDirectory(dir=directory, prefix='.defects.') as work:
+        runs_xs_path, runs_classes_path = os.path.join(work, 'x'), os.path.join(work, 'class')
+        # the codes of the classes in the runs are in the order they are first seen, they are sorted at the end
+        codes = {}
+        runs = []
+        n = 0
+        with open(runs_xs_path, 'wb') as xs_file, open(runs_classes_path, 'wb') as classes_file:
+            for xs, names in read_csv_blocks(path, block_size):
+                classes = np.array([codes.setdefault(name, len(codes)) for name in names], dtype=np.int16)
+                order = np.argsort(xs, kind='stable')
+                xs[order].tofile(xs_file)
+                classes[order].tofile(classes_file)
+                runs.append((n, len(xs)))
+                n += len(xs)
+        class_names = sorted(codes)
+        recode = np.zeros(max(len(codes), 1), dtype=np.int16)
+        for name, code in codes.items():
+            recode[code] = class_names.index(name)
+
+        out_xs_path = os.path.join(work, 'x.npy')
+        out_classes_path = os.path.join(work, 'class.npy')
+        out_xs = np.lib.format.open_memmap(out_xs_path, mode='w+', dtype=np.float64, shape=(n,))
+        out_classes = np.lib.format.open_memmap(out_classes_path, mode='w+', dtype=np.int16, shape=(n,))
+        if n:
+            runs_xs = np.memmap(runs_xs_path, dtype=np.float64, mode='r', shape=(n,))
+            runs_classes = np.memmap(runs_classes_path, dtype=np.int16, mode='r', shape=(n,))
+            _merge_runs(runs_xs, runs_classes, runs, out_xs, out_classes, recode,
+                        max(block_size // len(runs), 4096))
+            del runs_xs, runs_classes
+        out_xs.flush()
+        out_classes.flush()
+        del out_xs, out_classes
+        os.replace(out_xs_path, xs_path)
+        os.replace(out_classes_path, classes_path)
+    return class_names, n
+
+
+# merges the sorted runs (offset, length) of xs and classes into out_xs and out_classes, the classes recoded,
+# reading block_size defects of each run at a time.
+# The defects are ordered by x, then by run, so equal xs keep the order of the csv, as with a stable sort:
+# at each step, the defects up to the last one read of the run that ends first in this order are written
+def _merge_runs(xs, classes, runs, out_xs, out_classes, recode, block_size):
+    positions = [offset for offset, _ in runs]
+    ends = [offset + length for offset, length in runs]
+    buffers = [(xs[0:0], classes[0:0])] * len(runs)
+    written = 0
+    while True:
+        for r in range(len(runs)):
+            if not len(buffers[r][0]) and positions[r] < ends[r]:
+                stop = min(positions[r] + block_size, ends[r])
+                buffers[r] = (np.array(xs[positions[r]:stop]), np.array(classes[positions[r]:stop]))
+                positions[r] = stop
+        # the defects after the buffer of a run that is not fully read can be smaller than the other buffers
+        bounds = [(buffers[r][0][-1], r) for r in range(len(runs)) if positions[r] < ends[r]]
+        bound_x, bound_run = min(bounds) if bounds else (np.inf, len(runs))
+        parts = []
+        for r, (run_xs, run_classes) in enumerate(buffers):
+            if r == bound_run or not bounds:
+                taken = len(run_xs)
+            else:
+                taken = int(np.searchsorted(run_xs, bound_x, side='right' if r < bound_run else 'left'))
+            parts.append((run_xs[:taken], run_classes[:taken]))
+            buffers[r] = (run_xs[taken:], run_classes[taken:])
+        step_xs = np.concatenate([part[0] for part in parts])
+        if not len(step_xs):
+            break
+        step_classes = np.concatenate([part[1] for part in parts])
+        order = np.argsort(step_xs, kind='stable')
+        out_xs[written:written + len(order)] = step_xs[order]
+        out_classes[written:written + len(order)] = recode[step_classes[order]]
+        written += len(order)
+
+
+# generates random defects for a roll of roll_size units, reproducible with seed
+# density is the mean number of defects per unit of dough, and class_mix the probability of each defect class
+def generate_defects(roll_size, density=1.0, class_mix=None, seed=None):
+    if class_mix is None:
+        class_mix = {'a': 1 / 3, 'b': 1 / 3, 'c': 1 / 3}
+    rng = np.random.default_rng(seed)
+    class_names = sorted(class_mix)
+    probabilities = np.array([class_mix[name] for name in class_names], dtype=np.float64)
+    n = rng.poisson(density * roll_size)
+    xs = np.sort(rng.uniform(0, roll_size, n))
+    classes = rng.choice(len(class_names), size=n, p=probabilities / probabilities.sum()).astype(np.int16)
+    return Defects(xs, classes, class_names)
+
+
+# loads the defects of a csv file
+# the first time a file is read, its defects are also saved in binary .npy files next to it,
+# with the size and modification time of the csv. As long as the csv is unchanged,
+# the next loads memory-map the .npy files instead of parsing the csv again.
+# The cache files are never rewritten in place: they are written to temporary files that replace them
+# (the meta file last), so the defects already memory-mapped keep the files they were read from,
+# and a process loading the file at the same time never sees a half-written cache
+def load_defects(path=None, use_cache=True):
+    if path is None:
+        path = DEFAULT_DEFECTS_PATH
+    if not use_cache:
+        return read_csv(path)
+
+    stat = os.stat(path)
+    fingerprint = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    xs_path, classes_path, meta_path = path + '.x.npy', path + '.class.npy', path + '.json'
+    try:
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+        if meta['csv'] == fingerprint:
+            xs = np.load(xs_path, mmap_mode='r')
+            classes = np.load(classes_path, mmap_mode='r')
+            # the cache files of another version of the csv, replaced after this meta file was read
+            if len(xs) == len(classes) == meta['n']:
+                return Defects(xs, classes, meta['class_names'])
+    except (OSError, ValueError, KeyError):
+        pass
+
+    # the csv is converted by blocks, so a file larger than the memory can be loaded
+    try:
+        class_names, n = convert_csv(path, xs_path, classes_path)
+        meta = {'csv': fingerprint, 'class_names': class_names, 'n': n}
+        _replace_file(meta_path, lambda f: f.write(json.dumps(meta).encode()))
+    except OSError:
+        # the cache is only an optimization, the defects are still returned if it cannot be written
+        return read_csv(path)
+    return Defects(np.load(xs_path, mmap_mode='r'), np.load(classes_path, mmap_mode='r'), class_names)
+
+
+# writes a file with write(f) to a temporary file in its directory, which then replaces it
+def _replace_file(path, write):
+    fd, temporary_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                                          prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.unlink(temporary_path)
+        raise
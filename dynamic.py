@@ -0,0 +1,158 @@
+import numpy as np
+from biscuits_racel import Roll, biscuit_types, as_defects_index
+
+
+# Exact solver by dynamic programming over the positions of the roll
+# best_values[position] is the best price that can be obtained with the part of the roll that starts at position
+# at each position, we either leave one unit of dough empty, or we place a biscuit that is valid at that position
+# and continue right after it.
+# The table is filled from the end of the roll to its start, so there is no recursion,
+# and each position is computed once: the cost is O(roll_size * number of biscuit types)
+# defects are the defects of the roll, see biscuits_racel.as_defects_index
+def dynamic_programming(roll_size=500, biscuits=None, defects=None):
+    if biscuits is None:
+        biscuits = biscuit_types
+    defects = as_defects_index(defects)
+
+    best_values, best_choices = solve_table(defects.feasibility_mask(roll_size, biscuits), biscuits)
+
+    # follow the choices from the start of the roll to build the optimal roll
+    roll = Roll(roll_size, defects)
+    position = 0
+    while position < roll_size:
+        biscuit = best_choices[position]
+        roll.append_biscuits([biscuit])
+        position += 1 if biscuit is None else biscuit.size
+
+    return roll
+
+
+# fills the tables of the dynamic programming from a feasibility mask of the biscuits
+# returns best_values, and best_choices where best_choices[position] is the biscuit placed at position
+# in the optimal placement, None for an empty unit
+def solve_table(mask, biscuits):
+    roll_size = mask.shape[1]
+    best_values = [0] * (roll_size + 1)
+    best_choices = [None] * (roll_size + 1)
+    # valid_starts[i][position] tells if biscuits[i] can start at position
+    fill_table(best_values, best_choices, mask.tolist(), biscuits, 0, roll_size)
+    return best_values, best_choices
+
+
+# fills the positions [start, end) of the tables, from end - 1 down to start
+# the tables have to be right from end to the end of the roll
+def fill_table(best_values, best_choices, valid_starts, biscuits, start, end):
+    for position in range(end - 1, start - 1, -1):
+        best_values[position] = best_values[position + 1]
+        best_choices[position] = None
+        for i, biscuit in enumerate(biscuits):
+            if not valid_starts[i][position]:
+                continue
+            value = biscuit.value + best_values[position + biscuit.size]
+            if value > best_values[position]:
+                best_values[position] = value
+                best_choices[position] = biscuit
+
+
+# same as fill_table, in the other direction: prefix_values[position] is the best price of the roll
+# before position, and prefix_choices[position] the biscuit that ends at position in it, None for an empty unit
+# fills the positions [start, end), the tables have to be right up to start - 1
+def fill_prefix_table(prefix_values, prefix_choices, valid_starts, biscuits, start, end):
+    for position in range(max(start, 1), end):
+        prefix_values[position] = prefix_values[position - 1]
+        prefix_choices[position] = None
+        for i, biscuit in enumerate(biscuits):
+            biscuit_start = position - biscuit.size
+            if biscuit_start < 0 or not valid_starts[i][biscuit_start]:
+                continue
+            value = prefix_values[biscuit_start] + biscuit.value
+            if value > prefix_values[position]:
+                prefix_values[position] = value
+                prefix_choices[position] = biscuit
+
+
+# Dynamic programming that is repaired when a few defects of the roll are added or removed
+# Besides best_values, the best price of the roll after each position, it keeps prefix_values,
+# the best price of the roll before each position. The changed defects only change the feasibility of
+# the starts close to them, in [lo, hi), see DefectIndex.updated: prefix_values stays right up to lo,
+# and best_values from hi. best_values is filled again from hi down to lo - max_size + 1,
+# and the best roll is cut at the position of [lo - max_size + 1, lo] where prefix_values + best_values is the
+# highest: every roll has a biscuit or an empty unit that starts there. So a repair costs O(hi - lo + max_size)
+# instead of O(roll_size), and the parts of the tables that are not right anymore are only filled again
+# when a later repair needs them
+class DynamicSolver:
+    def __init__(self, roll_size=500, biscuits=None, defects=None):
+        if biscuits is None:
+            biscuits = biscuit_types
+        self.roll_size = roll_size
+        self.biscuits = biscuits
+        self.max_size = max(biscuit.size for biscuit in biscuits)
+        self.defects = as_defects_index(defects)
+        self.valid_starts = self.defects.feasibility_mask(roll_size, biscuits).tolist()
+
+        self.best_values = [0] * (roll_size + 1)
+        self.best_choices = [None] * (roll_size + 1)
+        fill_table(self.best_values, self.best_choices, self.valid_starts, biscuits, 0, roll_size)
+        self.prefix_values = [0] * (roll_size + 1)
+        self.prefix_choices = [None] * (roll_size + 1)
+        fill_prefix_table(self.prefix_values, self.prefix_choices, self.valid_starts, biscuits, 0, roll_size + 1)
+        # prefix tables right on [0, prefix_end], best tables right on [best_start, roll_size]
+        self.prefix_end = roll_size
+        self.best_start = 0
+        # position where the best roll is cut between the prefix and the best tables
+        self.cut = 0
+
+    def best_price(self):
+        return self.prefix_values[self.cut] + self.best_values[self.cut]
+
+    # the best roll, with None for the empty units
+    def roll(self):
+        prefix = []
+        position = self.cut
+        while position > 0:
+            biscuit = self.prefix_choices[position]
+            prefix.append(biscuit)
+            position -= 1 if biscuit is None else biscuit.size
+
+        roll = Roll(self.roll_size, self.defects)
+        roll.append_biscuits(prefix[::-1])
+        position = self.cut
+        while position < self.roll_size:
+            biscuit = self.best_choices[position]
+            roll.append_biscuits([biscuit])
+            position += 1 if biscuit is None else biscuit.size
+        return roll
+
+    # adds and removes {'x', 'class'} defects, repairs the tables and returns the new best roll
+    def update(self, added=(), removed=()):
+        xs = [float(defect['x']) for defect in list(added) + list(removed)]
+        if not xs:
+            return self.roll()
+        self.defects = self.defects.updated(added, removed)
+        mask = self.defects.feasibility_mask(self.roll_size, self.biscuits)
+
+        # starts whose feasibility may have changed, see DefectIndex.updated
+        lo = min(max(int(np.floor(min(xs))) - self.max_size, 0), self.roll_size)
+        hi = min(max(int(np.ceil(max(xs))) + 1, 0), self.roll_size)
+        for i in range(len(self.biscuits)):
+            self.valid_starts[i][lo:hi] = mask[i, lo:hi].tolist()
+        self.prefix_end = min(self.prefix_end, lo)
+        self.best_start = max(self.best_start, hi)
+
+        window_start = max(lo - self.max_size + 1, 0)
+        if self.prefix_end < lo:
+            fill_prefix_table(self.prefix_values, self.prefix_choices, self.valid_starts, self.biscuits,
+                              self.prefix_end + 1, lo + 1)
+            self.prefix_end = lo
+        fill_table(self.best_values, self.best_choices, self.valid_starts, self.biscuits,
+                   window_start, self.best_start)
+        self.best_start = window_start
+
+        self.cut = max(range(window_start, lo + 1), key=lambda c: self.prefix_values[c] + self.best_values[c])
+        return self.roll()
+
+
+if __name__ == '__main__':
+    best_roll = dynamic_programming(500)
+    print(f'Best price is : {best_roll.total_price()}, best number of biscuits is :{best_roll.biscuit_type_count()}')
+    print(f'Roll is valid : {best_roll.check_biscuits_tolerance()}')
@@ -1,90 +1,72 @@
-from biscuits_clement import biscuit_types, defects_list, Roll
-from constraint import Problem
-
-
-# Global access within this module for defects_list
-def get_defects_between(start, end, defects_list):
-    return [defect for defect in defects_list if start <= defect['x'] < end]
-
-# Constraint to ensure no overlapping biscuits
-def no_overlap_constraint(*positions):
-    sizes = [b.size for b in biscuit_types]  # Access the global biscuit_types
-    for i, pos in enumerate(positions[:-1]):
-        if pos + sizes[i] > positions[i + 1]:
-            return False
-    return True
-
-# Constraint to ensure defects are within tolerance
-def defects_within_tolerance(*positions):
-    for i, pos in enumerate(positions):
-        biscuit = biscuit_types[i]  # Access the global biscuit_types
-        defects_in_range = get_defects_between(pos, pos + biscuit.size, defects_list)
-        defect_counts = {defect_class: 0 for defect_class in biscuit.tolerance.keys()}
-        for defect in defects_in_range:
-            defect_class = defect['class']
-            defect_counts[defect_class] += 1
-        if not biscuit.is_valid(defect_counts):
-            return False
-    return True
-
-# Function to calculate the total value of biscuits on the roll
-def calculate_total_value(*positions):
-    total_value = 0
-    for i, pos in enumerate(positions):
-        total_value += biscuit_types[i].value
-    return total_value
-
-# Create the problem instance
-problem = Problem()
-
-# Variables for the positions of each biscuit type on the roll
-roll_size = 500
-
-# Assuming that biscuit_types are sorted by value with the most valuable first
-biscuit_types.sort(key=lambda b: -b.value)
-for i, biscuit in enumerate(biscuit_types):
-    problem.addVariable(f"Biscuit_{i}", range(roll_size - biscuit.size + 1))
-
-# Add constraints to the problem
-problem.addConstraint(no_overlap_constraint, [f"Biscuit_{i}" for i in range(len(biscuit_types))])
-problem.addConstraint(defects_within_tolerance, [f"Biscuit_{i}" for i in range(len(biscuit_types))])
+from bisect import bisect_left
+import numpy as np
+from biscuits_clement import biscuit_types, Roll, feasibility_mask
+from constraints import PlacementProblem
+
+
+# Constraint formulation of the roll, solved by the placement engine of constraints
+# counts[i] is the number of biscuits of type biscuit_types[i] to place, by default one of each type
+def constraint_problem(roll_size=500, counts=None, defects=None):
+    if counts is None:
+        counts = [1] * len(biscuit_types)
+    problem = PlacementProblem(roll_size, biscuit_types, defects)
+    for biscuit, count in zip(biscuit_types, counts):
+        problem.add_biscuits(biscuit, count)
+    return problem
 
 # Heuristic approach
-def greedy_heuristic():
-    roll = Roll(roll_size=500)
-    positions_filled = [False] * 500  # A simple way to track filled positions
+# defects are the defects of the roll (a Defects or a list of dicts), by default the ones of defects.csv
+def greedy_heuristic(roll_size=500, defects=None):
+    roll = Roll(roll_size=roll_size)
+    # occupied[position] tells if a biscuit covers position, the end of the roll is a sentinel
+    occupied = np.zeros(roll_size + 1, dtype=bool)
+    occupied[roll_size] = True
+    units = np.arange(roll_size + 1)
+    positions = units[:-1]
+
+    sorted_biscuits = sorted(biscuit_types, key=lambda b: -b.value)  # Sort by value as a heuristic
+    # valid_starts[code][position] tells if sorted_biscuits[code] is within tolerance at position
+    valid_starts = feasibility_mask(roll.roll_size, sorted_biscuits, defects)
+    for code, biscuit in enumerate(sorted_biscuits):
+        # The biscuits of a type are placed from left to right, so a placement only fills dough after the position
+        # the pass has reached, and the free runs can be found once for the whole pass:
+        # next_occupied[position] is the first covered position at or after position
+        next_occupied = np.minimum.accumulate(np.where(occupied, units, roll_size)[::-1])[::-1]
+        candidates = np.flatnonzero(valid_starts[code] & (next_occupied[:-1] >= positions + biscuit.size)).tolist()
+        # the candidates under a placed biscuit are jumped over by bisection
+        i = 0
+        while i < len(candidates):
+            position = candidates[i]
+            occupied[position:position + biscuit.size] = True
+            biscuit_dict = {'start': position, 'end': position + biscuit.size, 'biscuit': biscuit}
+            roll.append_biscuits(biscuit_dict)
+            i = bisect_left(candidates, position + biscuit.size, i)
 
-    for biscuit in sorted(biscuit_types, key=lambda b: -b.value):  # Sort by value as a heuristic
-        for position in range(roll.roll_size - biscuit.size + 1):
-            if not any(positions_filled[position:position + biscuit.size]):  # Check if space is free
-                defects_in_range = get_defects_between(position, position + biscuit.size, defects_list)
-                defect_counts = {defect_class: 0 for defect_class in biscuit.tolerance.keys()}
-                for defect in defects_in_range:
-                    defect_class = defect['class']
-                    defect_counts[defect_class] += 1
+    return roll
 
-                if biscuit.is_valid(defect_counts):
-                    # Fill the positions and add the biscuit to the roll
-                    for i in range(position, position + biscuit.size):
-                        positions_filled[i] = True  # Mark positions as filled
-                    biscuit_dict = {'start': position, 'end': position + biscuit.size, 'biscuit': biscuit}
-                    roll.append_biscuits(biscuit_dict)
 
-    return roll
+if __name__ == '__main__':
+    # Run the heuristic and get the Roll object with the best arrangement
+    best_roll = greedy_heuristic()
 
-# Run the heuristic and get the Roll object with the best arrangement
-best_roll = greedy_heuristic()
+    # Now you can access the total value and other properties of the best_roll
+    print(f"The total value of the best roll is: {best_roll.total_value()}")
+    print(f"The biscuits counts of the best roll is: {best_roll.biscuit_type_count()}")
 
-# Now you can access the total value and other properties of the best_roll
-print(f"The total value of the best roll is: {best_roll.total_value()}")
-print(f"The biscuits counts of the best roll is: {best_roll.biscuit_type_count()}")
+    # To get the number of each biscuit type in the best roll
+    biscuit_count = {}
+    for biscuit_info in best_roll._biscuits:
+        biscuit_type = type(biscuit_info['biscuit'])
+        biscuit_count[biscuit_type] = biscuit_count.get(biscuit_type, 0) + 1
 
-# To get the number of each biscuit type in the best roll
-biscuit_count = {}
-for biscuit_info in best_roll._biscuits:
-    biscuit_type = type(biscuit_info['biscuit'])
-    biscuit_count[biscuit_type] = biscuit_count.get(biscuit_type, 0) + 1
+    print("Number of each biscuit type in the best roll:")
+    for biscuit_type, count in biscuit_count.items():
+        print(f"{biscuit_type}: {count}")
 
-print("Number of each biscuit type in the best roll:")
-for biscuit_type, count in biscuit_count.items():
-    print(f"{biscuit_type}: {count}")
+    # Place the same biscuits as the best roll with the constraint engine
+    counts = [0] * len(biscuit_types)
+    for biscuit_info in best_roll._biscuits:
+        counts[biscuit_types.index(biscuit_info['biscuit'])] += 1
+    problem = constraint_problem(counts=counts)
+    placements = problem.solve()
+    print(f"The constraint engine placed {len(placements)} biscuits in {problem.nodes} nodes")
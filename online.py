@@ -0,0 +1,110 @@
+from collections import deque
+from math import ceil
+from biscuits_racel import DefectIndex, Roll, RollLayout, biscuit_types
+from defects import Defects, load_defects
+from dynamic import solve_table
+
+
+# Online solver for a roll that is inspected while it moves
+# The defects arrive in increasing x: once a defect at x has arrived, the dough before x is fully inspected.
+# The inspected dough that is not committed yet is solved by dynamic programming,
+# and the placements that end more than lookahead units before the end of the inspected dough are committed:
+# the next defects cannot change them anymore, and the look-ahead lets the solver see the dough that follows them.
+# Only the defects after the committed placements are kept, and the dough is solved by windows of at most
+# max_window units, so the memory and the time spent on each defect do not depend on the length of the roll.
+# The placements are {'start', 'end', 'biscuit'} dicts, like the ones a Roll can hold
+class OnlineSolver:
+    def __init__(self, roll_size=None, lookahead=64, max_window=None, biscuits=None):
+        if biscuits is None:
+            biscuits = biscuit_types
+        if max_window is None:
+            max_window = 4 * lookahead
+        self.roll_size = roll_size
+        self.lookahead = lookahead
+        self.max_window = max(max_window, lookahead + max(biscuit.size for biscuit in biscuits))
+        self.biscuits = biscuits
+        # the placements before committed are final, the dough before inspected has been inspected
+        self.committed = 0
+        self.inspected = 0
+        # end of the inspected dough at the last solve
+        self.solved = 0
+        # (x, class) of the defects after committed
+        self.window = deque()
+
+    # adds a defect, and returns the placements committed thanks to it
+    def push(self, x, defect_class):
+        if x <= self.committed:
+            raise ValueError(f'Defect at {x} is before the committed placements, which end at {self.committed}')
+        self.window.append((x, defect_class))
+        return self.advance(x)
+
+    # the dough before position has been inspected, returns the placements that can be committed
+    def advance(self, position):
+        self.inspected = max(self.inspected, position)
+        end = int(self.inspected)
+        if self.roll_size is not None:
+            end = min(end, self.roll_size)
+        # the solve would give the same placements as the last one
+        if end == self.solved or end - self.lookahead <= self.committed:
+            return []
+        self.solved = end
+
+        placements = []
+        # a long stretch of inspected dough is solved window by window
+        while end - self.committed > self.max_window:
+            window_end = self.committed + self.max_window
+            placements += self._commit(window_end, window_end - self.lookahead)
+        placements += self._commit(end, end - self.lookahead)
+        return placements
+
+    # the roll is fully inspected, commits all the remaining placements
+    def finish(self):
+        end = self.roll_size if self.roll_size is not None else ceil(self.inspected)
+        placements = []
+        while end - self.committed > self.max_window:
+            window_end = self.committed + self.max_window
+            placements += self._commit(window_end, window_end - self.lookahead)
+        placements += self._commit(end, end)
+        return placements
+
+    # solves the dough between committed and end, and commits the placements that end before limit
+    def _commit(self, end, limit):
+        defects = Defects.from_dicts({'x': x - self.committed, 'class': defect_class}
+                                     for x, defect_class in self.window)
+        mask = DefectIndex(defects).feasibility_mask(end - self.committed, self.biscuits)
+        _, best_choices = solve_table(mask, self.biscuits)
+
+        placements = []
+        position = self.committed
+        while position < limit:
+            biscuit = best_choices[position - self.committed]
+            if biscuit is None:
+                position += 1
+                continue
+            if position + biscuit.size > limit:
+                break
+            placements.append({'start': position, 'end': position + biscuit.size, 'biscuit': biscuit})
+            position += biscuit.size
+
+        self.committed = position
+        while self.window and self.window[0][0] <= position:
+            self.window.popleft()
+        return placements
+
+
+# places the biscuits of a roll from a stream of {'x', 'class'} defects, in increasing x
+# the placements are yielded as soon as they are committed
+def online_placements(defects_stream, roll_size=None, lookahead=64):
+    solver = OnlineSolver(roll_size, lookahead)
+    for defect in defects_stream:
+        yield from solver.push(defect['x'], defect['class'])
+    yield from solver.finish()
+
+
+if __name__ == '__main__':
+    roll = Roll(500)
+    for placement in online_placements(load_defects().to_dicts(), roll_size=500):
+        roll.append_biscuits(placement)
+    layout = RollLayout.from_roll(roll)
+    print(f'Online price is : {layout.total_price()}, valid : {layout.check_biscuits_tolerance()}, '
+          f'best number of biscuits is :{layout.biscuit_type_count()}')
@@ -0,0 +1,129 @@
+from bisect import bisect_right
+from itertools import accumulate, chain
+
+
+# Persistent sequence: an edit returns a new sequence, and leaves this one as it was
+# The items are kept in chunks, tuples of up to 2 * chunk_size items, and an edit only copies the chunk it changes
+# and the list of the chunks: the new sequence shares all the other chunks with the old one.
+# So an edit costs O(chunk_size + len / chunk_size) time and memory instead of a copy of the whole sequence,
+# and copying the sequence costs nothing: it cannot change.
+# ends[i] is the number of items in the chunks up to chunk i included, an index is found by bisection in it
+class ChunkedList:
+    __slots__ = ('_chunks', '_ends')
+    chunk_size = 32
+
+    def __init__(self, items=()):
+        items = tuple(items)
+        self._chunks = [items[i:i + self.chunk_size] for i in range(0, len(items), self.chunk_size)]
+        self._ends = list(accumulate(map(len, self._chunks)))
+
+    @classmethod
+    def _from_chunks(cls, chunks, ends=None):
+        sequence = cls.__new__(cls)
+        sequence._chunks = chunks
+        sequence._ends = list(accumulate(map(len, chunks))) if ends is None else ends
+        return sequence
+
+    def __len__(self):
+        return self._ends[-1] if self._ends else 0
+
+    def __iter__(self):
+        return chain.from_iterable(self._chunks)
+
+    # an index is an int, with the semantics of a list, or a slice, which returns a list
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.tolist()[index]
+        chunk, offset = self._locate(index)
+        return self._chunks[chunk][offset]
+
+    def __str__(self):
+        return str(self.tolist())
+
+    def __repr__(self):
+        return f'ChunkedList({self.tolist()!r})'
+
+    def __eq__(self, other):
+        if isinstance(other, ChunkedList):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    __hash__ = None
+
+    # the sequence cannot change, so it is its own copy
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def tolist(self):
+        return list(self)
+
+    # chunk and offset in it of the item at index, raises an IndexError like a list
+    def _locate(self, index):
+        length = len(self)
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError('ChunkedList index out of range')
+        chunk = bisect_right(self._ends, index)
+        return chunk, index - (self._ends[chunk - 1] if chunk else 0)
+
+    # new sequence with item at index
+    def set(self, index, item):
+        chunk, offset = self._locate(index)
+        chunks = self._chunks.copy()
+        old = chunks[chunk]
+        chunks[chunk] = old[:offset] + (item,) + old[offset + 1:]
+        # the lengths have not changed, the new sequence shares ends
+        return self._from_chunks(chunks, self._ends)
+
+    # new sequence with item inserted before index, with the semantics of list.insert
+    def insert(self, index, item):
+        length = len(self)
+        index = min(max(index + length if index < 0 else index, 0), length)
+        if not self._chunks:
+            return self._from_chunks([(item,)], [1])
+        chunk = min(bisect_right(self._ends, index), len(self._chunks) - 1)
+        offset = index - (self._ends[chunk - 1] if chunk else 0)
+        old = self._chunks[chunk]
+        new = old[:offset] + (item,) + old[offset:]
+        # a chunk that grew too long is split in two
+        if len(new) > 2 * self.chunk_size:
+            new = [new[:self.chunk_size], new[self.chunk_size:]]
+        else:
+            new = [new]
+        return self._from_chunks(self._chunks[:chunk] + new + self._chunks[chunk + 1:])
+
+    # new sequence without the item at index
+    def delete(self, index):
+        chunk, offset = self._locate(index)
+        old = self._chunks[chunk]
+        new = old[:offset] + old[offset + 1:]
+        return self._from_chunks(self._chunks[:chunk] + ([new] if new else []) + self._chunks[chunk + 1:])
+
+    # new sequence with items added at its end, the last chunk is filled first
+    # it copies the list of the chunks, so many items are better added with one extend than one by one
+    def extend(self, items):
+        items = tuple(items)
+        if not items:
+            return self
+        chunks = self._chunks.copy()
+        ends = self._ends.copy()
+        if chunks and len(chunks[-1]) < self.chunk_size:
+            room = self.chunk_size - len(chunks[-1])
+            chunks[-1] = chunks[-1] + items[:room]
+            ends[-1] += len(items[:room])
+            items = items[room:]
+        new = [items[i:i + self.chunk_size] for i in range(0, len(items), self.chunk_size)]
+        # only the ends of the new chunks are computed
+        end = ends[-1] if ends else 0
+        for chunk in new:
+            end += len(chunk)
+            ends.append(end)
+        chunks += new
+        return self._from_chunks(chunks, ends)
+
+    def append(self, item):
+        return self.extend((item,))
@@ -0,0 +1,144 @@
+import multiprocessing
+import queue
+import time
+from batch import as_layout, engines, read_defects
+from biscuits_racel import DefectIndex, biscuit_types
+from defects import DEFAULT_DEFECTS_PATH
+from search_control import SearchControl
+
+# options of the engines that can run until their control stops them, the others run to completion
+anytime_options = {
+    'bees': {'max_iter': None},
+    'bogo': {'max_iter': None},
+    'annealing': {},
+}
+
+# engines whose roll is always the best roll, so it is proven optimal
+exact_engines = {'dynamic'}
+
+
+# Control of an engine of the portfolio: on top of the deadline, it publishes the best price of its engine
+# to the incumbent shared by all the engines, and stops its engine as soon as the incumbent, the best price
+# of any engine, reaches target, or when stop_event is set: a roll is proven optimal by an exact engine
+class PortfolioControl(SearchControl):
+    def __init__(self, incumbent, stop_event, target, deadline=None):
+        super().__init__(deadline=deadline)
+        self.incumbent = incumbent
+        self.stop_event = stop_event
+        self.target = target
+
+    def update(self, best_quality, best):
+        super().update(best_quality, best)
+        publish(self.incumbent, best_quality)
+
+    def should_stop(self):
+        return self.stop_event.is_set() or self.incumbent.value >= self.target or super().should_stop()
+
+
+# raises the shared incumbent to price
+def publish(incumbent, price):
+    with incumbent.get_lock():
+        if price > incumbent.value:
+            incumbent.value = price
+
+
+# no roll can be worth more than the best value per unit of dough times the length of the roll
+def value_bound(roll_size):
+    return int(roll_size * max(biscuit.value / biscuit.size for biscuit in biscuit_types))
+
+
+# runs an engine of the portfolio in its own process, and sends its roll back through results,
+# as a layout without its defects, which the main process already has (see batch.as_layout)
+def run_engine(engine, roll_size, defects, options, incumbent, stop_event, target, deadline, results):
+    start = time.perf_counter()
+    if engine in anytime_options:
+        options = dict(anytime_options[engine], **options,
+                       control=PortfolioControl(incumbent, stop_event, target, deadline))
+    roll, _ = engines[engine](roll_size, defects, **options)
+    layout = as_layout(roll_size, roll)
+    layout.defects = DefectIndex(defects)
+    price = layout.total_price() if layout.check_biscuits_tolerance() else 0
+    layout.defects = None
+    publish(incumbent, price)
+    # no engine can beat the roll of an exact engine
+    if engine in exact_engines:
+        stop_event.set()
+    results.put((engine, layout, price, time.perf_counter() - start))
+
+
+# Races several engines on the same roll, each in its own process, until time_limit seconds have passed,
+# a roll is proven optimal by an exact engine, or the best price of the engines reaches target.
+# The engines share their best price (the incumbent) as they go, and the anytime engines (anytime_options)
+# stop at the deadline, as soon as the incumbent reaches target, or when a roll is proven optimal.
+# An engine that is not done grace seconds after that is killed, and its roll is lost.
+# target is the price of a roll good enough to stop at, by default value_bound: no roll can be worth more
+# engine_names are engines of batch.engines, and options[engine] the options of an engine
+# Returns a dict with the best roll (a biscuits_racel Roll), its price, the engine that found it,
+# whether it is proven optimal, the price of the roll of each engine (None if it was killed) and the time in seconds
+def portfolio(roll_size=500, defects=None, engine_names=('greedy', 'bees', 'bogo'), time_limit=10.0, options=None,
+              grace=1.0, target=None):
+    for engine in engine_names:
+        if engine not in engines:
+            raise ValueError(f'Unknown engine {engine}, engines are {list(engines)}')
+    if options is None:
+        options = {}
+    start = time.monotonic()
+    defects = read_defects(DEFAULT_DEFECTS_PATH if defects is None else defects)
+    upper_bound = value_bound(roll_size)
+    target = upper_bound if target is None else min(target, upper_bound)
+    deadline = start + time_limit
+    incumbent = multiprocessing.Value('q', -1)
+    stop_event = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=run_engine, daemon=True,
+                                args=(engine, roll_size, defects, options.get(engine, {}), incumbent, stop_event,
+                                      target, deadline, results))
+        for engine in engine_names
+    ]
+    for process in processes:
+        process.start()
+
+    rolls = {}
+    end = deadline + grace
+    while len(rolls) < len(processes):
+        now = time.monotonic()
+        if stop_event.is_set() or incumbent.value >= target:
+            end = min(end, now + grace)
+        if now >= end:
+            break
+        try:
+            engine, layout, price, _ = results.get(timeout=min(end - now, 0.1))
+            rolls[engine] = layout, price
+        except queue.Empty:
+            # an engine that failed never sends its roll
+            if not any(process.is_alive() for process in processes) and results.empty():
+                break
+    stop_event.set()
+    for process in processes:
+        process.kill()
+        process.join()
+
+    prices = {engine: rolls[engine][1] if engine in rolls else None for engine in engine_names}
+    if not rolls:
+        return {'roll': None, 'price': None, 'engine': None, 'optimal': False, 'prices': prices,
+                'time': time.monotonic() - start}
+    engine = max(rolls, key=lambda name: rolls[name][1])
+    layout, price = rolls[engine]
+    layout.defects = DefectIndex(defects)
+    return {
+        'roll': layout.to_roll(),
+        'price': price,
+        'engine': engine,
+        'optimal': price >= upper_bound or any(name in exact_engines for name in rolls),
+        'prices': prices,
+        'time': time.monotonic() - start,
+    }
+
+
+if __name__ == '__main__':
+    result = portfolio(500, engine_names=('greedy', 'bees', 'bogo', 'annealing'), time_limit=5.0)
+    print(f"Best price is : {result['price']}, found by {result['engine']} in {result['time']:.2f} s, "
+          f"proven optimal : {result['optimal']}")
+    print(f"Prices of the engines : {result['prices']}")
+    print(f"Roll is valid : {result['roll'].check_biscuits_tolerance()}")
@@ -0,0 +1,74 @@
+import json
+import time
+from collections import defaultdict
+
+
+# Instrumentation of a search: counters and timers, with one record per iteration
+# The search only calls the profiler if it was given one, so the instrumentation costs nothing when it is disabled.
+# Each record is a dict with the iteration, the best quality so far, the time spent in each phase,
+# and the counters of the iteration: the ones counted by the search (improvements, abandoned food sources...)
+# and the ones of the sources given to start_iteration (objective calls, defect queries, cache misses...)
+# callback, if given, is called with each record at the end of its iteration
+class Profiler:
+    def __init__(self, callback=None, first_iteration=0):
+        self.callback = callback
+        self.iteration = first_iteration
+        self.records = []
+        self.totals = defaultdict(float)
+        self._counters = defaultdict(int)
+        self._timers = defaultdict(float)
+        self._sources = []
+        self._start = None
+        self._lap = None
+
+    def count(self, name, n=1):
+        self._counters[name] += n
+
+    # the time since the previous lap (or the start of the iteration) is added to the timer of the phase
+    def lap(self, phase):
+        now = time.perf_counter()
+        self._timers[phase] += now - self._lap
+        self._lap = now
+
+    # sources are objects with a counters() method returning a dict of counters that only increase,
+    # their values at the start of the iteration are subtracted from their values at the end
+    def start_iteration(self, sources=()):
+        self._counters = defaultdict(int)
+        self._timers = defaultdict(float)
+        self._sources = [(source, source.counters()) for source in sources]
+        self._start = self._lap = time.perf_counter()
+
+    def end_iteration(self, best_quality):
+        record = {
+            'iteration': self.iteration,
+            'best_quality': best_quality,
+            'time': time.perf_counter() - self._start,
+        }
+        for phase, value in self._timers.items():
+            record[f'{phase}_time'] = value
+        for source, counters_at_start in self._sources:
+            for name, value in source.counters().items():
+                self._counters[name] += value - counters_at_start[name]
+        record.update(self._counters)
+
+        self.add_record(record)
+        self.iteration += 1
+        return record
+
+    # adds a record, made by this profiler or an other one (the profiler of an island of the search for instance)
+    def add_record(self, record):
+        self.records.append(record)
+        for name, value in record.items():
+            if name not in ('iteration', 'best_quality', 'island') and isinstance(value, (int, float)):
+                self.totals[name] += value
+        if self.callback is not None:
+            self.callback(record)
+
+    # writes the records as json lines, to a path or a file
+    def write_records(self, output):
+        if isinstance(output, str):
+            with open(output, 'w') as f:
+                self.write_records(f)
+            return
+        for record in self.records:
+            output.write(json.dumps(record) + '\n')
@@ -0,0 +1,97 @@
+import threading
+import time
+
+
+# Controls a running search: when it stops, and what its best solution is so far
+# The search stops at the first of
+#  - time_limit seconds after it started, or deadline, a time.monotonic() value
+#    (the monotonic clock is the same for all the processes of a machine, so a deadline can be sent to a pool),
+#  - patience iterations without an improvement of the best quality by more than min_improvement,
+#  - a call to stop(), from any thread.
+# An iteration is what the engine does between two checks: an iteration of the bees, a roll or a batch of rolls
+# for bogo, a step of all the chains for annealing.
+# The engines call start() when they start, then update() with their best solution after each iteration,
+# and stop when should_stop() is True. Other threads can poll the best solution with current() meanwhile.
+class SearchControl:
+    def __init__(self, time_limit=None, patience=None, min_improvement=0.0, deadline=None):
+        self.time_limit = time_limit
+        self.patience = patience
+        self.min_improvement = min_improvement
+        self.deadline = deadline
+        self._lock = threading.Lock()
+        self._stop_requested = False
+        self.reset()
+
+    def reset(self):
+        self.iteration = 0
+        self.best_quality = None
+        self.best_iteration = 0
+        # best quality at best_iteration, the improvements are counted from it
+        self.counted_quality = None
+        self.start_time = None
+        self._best = None
+        self._deadline = self.deadline
+
+    # the lock cannot be sent to other processes, they get a new one
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    # a control can be used for several runs: start() also clears a stop() of the previous run
+    def start(self):
+        with self._lock:
+            self.reset()
+            self._stop_requested = False
+            self.start_time = time.monotonic()
+            if self.time_limit is not None:
+                deadline = self.start_time + self.time_limit
+                self._deadline = deadline if self.deadline is None else min(self.deadline, deadline)
+
+    # best is the best solution of the search, or a function without arguments that builds it:
+    # the engines whose solutions are costly to build only build them when they are polled
+    def update(self, best_quality, best):
+        with self._lock:
+            self.iteration += 1
+            # small improvements add up: they are compared to the quality of the last counted improvement
+            if self.counted_quality is None or best_quality > self.counted_quality + self.min_improvement:
+                self.best_iteration = self.iteration
+                self.counted_quality = best_quality
+            if self.best_quality is None or best_quality > self.best_quality:
+                self.best_quality = best_quality
+                self._best = best
+
+    # whether the control stops any search by itself: with a deadline, a time limit or a patience
+    def is_bounded(self):
+        return self.deadline is not None or self.time_limit is not None or self.patience is not None
+
+    def should_stop(self):
+        if self._stop_requested:
+            return True
+        if self._deadline is not None and time.monotonic() >= self._deadline:
+            return True
+        return self.patience is not None and self.iteration - self.best_iteration >= self.patience
+
+    def stop(self):
+        self._stop_requested = True
+
+    # the best solution so far and its quality, (None, None) before the first iteration
+    def current(self):
+        with self._lock:
+            if callable(self._best):
+                self._best = self._best()
+            return self._best, self.best_quality
+
+    # the deadline of the running search, None if there is none
+    def current_deadline(self):
+        return self._deadline
+
+
+# raises a ValueError if a search could run forever: max_iter can only be None with a bounded control
+def check_bounded(max_iter, control):
+    if max_iter is None and (control is None or not control.is_bounded()):
+        raise ValueError('max_iter is None, the control needs a deadline, a time limit or a patience')
@@ -0,0 +1,206 @@
+from collections import deque
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from biscuits_racel import DefectIndex, RollLayout, biscuit_types, code_sizes
+from defects import Defects, load_defects
+
+# value of the positions a boundary condition cannot reach
+UNREACHABLE = -(1 << 60)
+
+
+# Segmented solving of very long rolls
+# The roll is split in chunks of chunk_size units, and the chunks are solved by groups of chunks_per_group,
+# each group in a process, all the chunks of a group advancing together with array operations.
+# The solution is the one of the dynamic programming (see dynamic.py), stitched exactly at the boundaries:
+# best_values[position] only depends on the feasibility after position, and on the best values of the
+# max_size positions after the chunk, its boundary condition. So each chunk computes how the best values at its
+# start depend on the ones at its end (a max-plus matrix of shape [max_size, max_size]), the matrices are chained
+# from the end of the roll to its start, and the chunks are solved again with their exact boundary condition.
+# A chunk is entered where the biscuit that crosses its start ends, so the path of every chunk is also
+# followed from each possible entry, and the entries are chained from the start of the roll.
+#
+# The defects are read with load_defects, so the defects of a csv file are memory-mapped once cached,
+# and a group only gets a copy of the defects of its part of the roll: the memory used is bounded by the
+# size of the groups, whatever the length of the roll.
+# Returns the best price and an iterator over the RollLayouts of the groups, in the order of the roll:
+# the biscuits of a group are only built when the iterator reaches it
+def segmented_solve(roll_size, defects=None, chunk_size=4096, chunks_per_group=256, n_processes=None):
+    if not isinstance(defects, Defects):
+        defects = load_defects(defects)
+    max_size = int(code_sizes[:len(biscuit_types)].max())
+    chunk_size = max(chunk_size, max_size)
+    n_chunks = -(-roll_size // chunk_size)
+    group_length = chunk_size * chunks_per_group
+    # a group is its start, its number of chunks, the size of its chunks, its length on the roll
+    # and the size of the roll
+    groups = [
+        (start, min(chunks_per_group, n_chunks - start // chunk_size), chunk_size, min(group_length, roll_size - start),
+         roll_size)
+        for start in range(0, roll_size, group_length)
+    ]
+    window = 2 * (n_processes or os.cpu_count() or 1)
+
+    with ProcessPoolExecutor(max_workers=n_processes) as pool:
+        tasks = ((group_defects(defects, group), group) for group in groups)
+        matrices = np.concatenate(list(_ordered_map(pool, transfer_matrices, tasks, window)))
+    # boundaries[k] are the best values of the max_size positions after chunk k,
+    # the roll is padded up to the end of its last chunk with dough where no biscuit is valid
+    boundaries = np.zeros((n_chunks, max_size), dtype=np.int64)
+    values = np.zeros(max_size, dtype=np.int64)
+    for k in range(n_chunks - 1, -1, -1):
+        boundaries[k] = values
+        values = (matrices[k] + values[None, :]).max(axis=1)
+    best_price = int(values[0])
+
+    return best_price, _layouts(defects, groups, boundaries, roll_size, n_processes, window)
+
+
+def _layouts(defects, groups, boundaries, roll_size, n_processes, window):
+    def chunks(array, group):
+        first = group[0] // group[2]
+        return array[first:first + group[1]]
+
+    with ProcessPoolExecutor(max_workers=n_processes) as pool:
+        tasks = ((group_defects(defects, group), group, chunks(boundaries, group)) for group in groups)
+        exits = np.concatenate(list(_ordered_map(pool, chunk_exits, tasks, window)))
+        # the path enters the first chunk at its start, and each next chunk where it left the previous one
+        entries = np.zeros(len(exits), dtype=np.int64)
+        for k in range(len(exits) - 1):
+            entries[k + 1] = exits[k, entries[k]]
+
+        tasks = (
+            (group_defects(defects, group), group, chunks(boundaries, group), chunks(entries, group))
+            for group in groups
+        )
+        for codes, starts in _ordered_map(pool, chunk_placements, tasks, window):
+            yield RollLayout(roll_size, codes, starts)
+
+
+# map of a pool that yields the results in order, with at most window tasks submitted ahead of the results
+def _ordered_map(pool, function, tasks, window):
+    pending = deque()
+    for task in tasks:
+        pending.append(pool.submit(function, task))
+        if len(pending) > window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+# copy of the defects under a group and the biscuits that cross its end, with their x relative to its start
+def group_defects(defects, group):
+    start, _, _, length, _ = group
+    max_size = int(code_sizes[:len(biscuit_types)].max())
+    i, j = np.searchsorted(defects.xs, [start, start + length + max_size])
+    return Defects(np.array(defects.xs[i:j]) - start, np.array(defects.classes[i:j]), defects.class_names)
+
+
+# feasibility of the chunks of a group, of shape [n_chunks, len(biscuit_types), chunk_size]
+def group_mask(defects, group):
+    start, n_chunks, chunk_size, length, roll_size = group
+    max_size = int(code_sizes[:len(biscuit_types)].max())
+    # a group is followed by the dough left on the roll, up to max_size units: none after the last group,
+    # and less than max_size units before a last group shorter than the biggest biscuit
+    group_size = min(length + max_size, roll_size - start)
+    mask = np.zeros((len(biscuit_types), n_chunks * chunk_size), dtype=bool)
+    mask[:, :length] = DefectIndex(defects).feasibility_mask(group_size)[:, :length]
+    return mask.reshape(len(biscuit_types), n_chunks, chunk_size).transpose(1, 0, 2)
+
+
+# max-plus matrices of the chunks of a group: best_values[start + i] = max_j(matrix[i, j] + best_values[end + j])
+def transfer_matrices(task):
+    defects, group = task
+    _, n_chunks, chunk_size, _, _ = group
+    mask = group_mask(defects, group)
+    max_size = int(code_sizes[:len(biscuit_types)].max())
+    # ring[position % max_size] are the best values at position, for each chunk and each boundary value
+    ring = np.full((max_size, n_chunks, max_size), UNREACHABLE, dtype=np.int64)
+    for j in range(max_size):
+        ring[(chunk_size + j) % max_size, :, j] = 0
+    for position in range(chunk_size - 1, -1, -1):
+        best = ring[(position + 1) % max_size].copy()
+        for code, biscuit in enumerate(biscuit_types):
+            value = ring[(position + biscuit.size) % max_size] + biscuit.value
+            best = np.where(mask[:, code, position, None], np.maximum(best, value), best)
+        ring[position % max_size] = best
+    return np.stack([ring[i % max_size] for i in range(max_size)], axis=1)
+
+
+# best choices of the chunks of a group, given the best values after them, -1 for an empty unit
+# same choices as dynamic.solve_table
+def chunk_choices(defects, group, group_boundaries):
+    _, n_chunks, chunk_size, _, _ = group
+    mask = group_mask(defects, group)
+    max_size = int(code_sizes[:len(biscuit_types)].max())
+    ring = np.empty((max_size, n_chunks), dtype=np.int64)
+    for j in range(max_size):
+        ring[(chunk_size + j) % max_size] = group_boundaries[:, j]
+    choices = np.empty((n_chunks, chunk_size), dtype=np.int8)
+    for position in range(chunk_size - 1, -1, -1):
+        best = ring[(position + 1) % max_size].copy()
+        choice = np.full(n_chunks, -1, dtype=np.int8)
+        for code, biscuit in enumerate(biscuit_types):
+            value = ring[(position + biscuit.size) % max_size] + biscuit.value
+            better = mask[:, code, position] & (value > best)
+            best = np.where(better, value, best)
+            choice[better] = code
+        ring[position % max_size] = best
+        choices[:, position] = choice
+    return choices
+
+
+# follows the choices of each chunk from entries (an offset in each chunk, or several),
+# returns where the paths leave the chunks, as offsets in the next chunks,
+# and the codes, chunks and offsets of the biscuits they go through
+def follow(choices, entries):
+    chunk_size = choices.shape[1]
+    chunks = np.broadcast_to(np.arange(len(choices)).reshape((-1,) + (1,) * (entries.ndim - 1)), entries.shape)
+    positions = entries.copy()
+    steps = []
+    active = positions < chunk_size
+    while active.any():
+        codes = choices[chunks[active], positions[active]]
+        steps.append((codes, chunks[active], positions[active]))
+        positions[active] += code_sizes[codes]
+        active = positions < chunk_size
+    return positions - chunk_size, steps
+
+
+# where the path of each chunk of a group leaves it, for each offset it can enter it at
+def chunk_exits(task):
+    choices = chunk_choices(*task)
+    max_size = int(code_sizes[:len(biscuit_types)].max())
+    exits, _ = follow(choices, np.tile(np.arange(max_size), (len(choices), 1)))
+    return exits
+
+
+# codes and starts on the roll of the biscuits of the best path through a group
+def chunk_placements(task):
+    defects, group, group_boundaries, entries = task
+    start, _, chunk_size, _, _ = group
+    choices = chunk_choices(defects, group, group_boundaries)
+    _, steps = follow(choices, np.array(entries, dtype=np.int64))
+    if not steps:
+        return np.empty(0, dtype=np.int16), np.empty(0, dtype=np.int64)
+    codes, chunks, positions = (np.concatenate(arrays) for arrays in zip(*steps))
+    starts = start + chunks * chunk_size + positions
+    order = np.argsort(starts, kind='stable')
+    biscuits = codes[order] >= 0
+    return codes[order][biscuits], starts[order][biscuits]
+
+
+if __name__ == '__main__':
+    price, layouts = segmented_solve(500, chunk_size=64)
+    n_biscuits = sum(layout.number_of_biscuits() for layout in layouts)
+    print(f'Best price is : {price}, number of biscuits is : {n_biscuits}')
+
+    # the last group ends at the end of the roll, also when the roll is a multiple of the chunks
+    from dynamic import dynamic_programming
+    price, _ = segmented_solve(500, chunk_size=100, chunks_per_group=2)
+    print(f'Price with full chunks is : {price}, price of the dynamic programming is : '
+          f'{dynamic_programming(500).total_price()}')
+    # and a biscuit of the group before a last group shorter than the biggest biscuit cannot cross it
+    price, _ = segmented_solve(503, chunk_size=100, chunks_per_group=1)
+    print(f'Price with a short last group is : {price}, price of the dynamic programming is : '
+          f'{dynamic_programming(503).total_price()}')
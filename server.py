@@ -0,0 +1,236 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from batch import as_layout, engines
+from biscuits_racel import DefectIndex
+from defects import DEFAULT_DEFECTS_PATH, load_defects
+
+# default socket of the solver service, it can be changed with the BISCUITS_SOCKET environment variable
+DEFAULT_SOCKET_PATH = os.environ.get('BISCUITS_SOCKET', '/tmp/biscuits.sock')
+
+# engines of batch.engines that work on biscuits_clement, they take the defects instead of their index
+clement_engines = {'greedy'}
+
+# engines whose jobs on small rolls are cheap, and can wait for each other in a batch:
+# the jobs of the other engines (the anytime ones, whose time depends on their options) are sent alone,
+# and the jobs of bogo too when they draw more than batched_bogo_iter rolls
+batched_engines = {'greedy', 'dynamic', 'bogo'}
+batched_bogo_iter = 500
+
+# defect indexes of the defects files already read by a worker process, by path, the least recently used first
+# an index keeps the feasibility masks it computed, so the next jobs on the same file reuse them
+_indexes = OrderedDict()
+index_cache_size = 16
+
+
+# index of the defects of a job: the path of a csv file, a list of {'x', 'class'} dicts,
+# or None for the defects of DEFAULT_DEFECTS_PATH
+# the index of a file is cached in the worker process, until the file changes
+def job_defects(defects):
+    if defects is not None and not isinstance(defects, str):
+        return DefectIndex(defects)
+    path = DEFAULT_DEFECTS_PATH if defects is None else defects
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    if key in _indexes:
+        _indexes.move_to_end(key)
+        return _indexes[key]
+    index = DefectIndex(load_defects(path))
+    _indexes[key] = index
+    if len(_indexes) > index_cache_size:
+        _indexes.popitem(last=False)
+    return index
+
+
+# solves a job, a dict with an engine of batch.engines, a roll_size, defects (see job_defects) and options
+# returns the price of the roll, and the roll as the codes and starts of its biscuits (see RollLayout),
+# or an error message
+def solve_job(job):
+    start = time.perf_counter()
+    try:
+        engine = job.get('engine', 'greedy')
+        if engine not in engines:
+            raise ValueError(f'Unknown engine {engine}, engines are {list(engines)}')
+        roll_size = int(job.get('roll_size', 500))
+        index = job_defects(job.get('defects'))
+        defects = index.defects if engine in clement_engines else index
+        roll, _ = engines[engine](roll_size, defects, **job.get('options', {}))
+        layout = as_layout(roll_size, roll)
+        layout.defects = index
+        return {
+            'engine': engine,
+            'roll_size': roll_size,
+            'price': layout.total_price() if layout.check_biscuits_tolerance() else 0,
+            'codes': layout.codes.tolist(),
+            'starts': layout.starts.tolist(),
+            'time': time.perf_counter() - start,
+        }
+    except Exception as error:
+        return {'error': f'{error.__class__.__name__}: {error}', 'time': time.perf_counter() - start}
+
+
+# solves the jobs of a batch one after the other, in a worker process
+def solve_jobs(jobs):
+    return [solve_job(job) for job in jobs]
+
+
+# Solver service on a Unix socket
+# The clients send jobs as json objects, one per line, with an id that the result of the job is sent back with.
+# The jobs are solved by a pool of worker processes that stay up between the jobs, with the engines already imported
+# and the defect indexes (and their feasibility masks) of the files they read kept in memory.
+# The cheap jobs (see is_batched) are gathered in batches of up to batch_size jobs,
+# waiting at most batch_delay seconds for a batch to fill, so that a batch costs one round trip to a worker.
+# The results are sent back as soon as their batch is done, not in the order of the jobs: as the results of a batch
+# all wait for its slowest job, the jobs of the slow engines are never batched.
+# Backpressure: at most max_pending jobs wait for a worker, and at most max_batches batches are in the pool,
+# when they are full the service stops reading the sockets of the clients until a worker is free
+class SolverServer:
+    def __init__(self, socket_path=None, n_processes=None, max_pending=256, max_batches=None, batch_size=32,
+                 batch_delay=0.005, small_roll_size=10_000):
+        self.socket_path = DEFAULT_SOCKET_PATH if socket_path is None else socket_path
+        self.n_processes = n_processes or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self.max_batches = 2 * self.n_processes if max_batches is None else max_batches
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.small_roll_size = small_roll_size
+        self.pool = None
+        self.jobs = None
+        self.batches = None
+
+    async def serve(self):
+        self.jobs = asyncio.Queue(self.max_pending)
+        self.batches = asyncio.Semaphore(self.max_batches)
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        # the workers are started from a fork server, which imports the engines once:
+        # forked from this process, they would inherit the sockets of the clients and keep them open
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(['batch', 'server'])
+        with ProcessPoolExecutor(max_workers=self.n_processes, mp_context=context) as self.pool:
+            # all the workers are started before the first job
+            loop = asyncio.get_running_loop()
+            await asyncio.gather(*(loop.run_in_executor(self.pool, solve_jobs, [])
+                                   for _ in range(self.n_processes)))
+            server = await asyncio.start_unix_server(self.handle, path=self.socket_path)
+            batcher = asyncio.create_task(self.batch_jobs())
+            try:
+                async with server:
+                    await server.serve_forever()
+            finally:
+                batcher.cancel()
+                os.unlink(self.socket_path)
+
+    # reads the jobs of a client, and writes their results as they are done
+    async def handle(self, reader, writer):
+        replies = set()
+        try:
+            while line := await reader.readline():
+                try:
+                    job = json.loads(line)
+                    if not isinstance(job, dict):
+                        raise ValueError('a job is a json object')
+                except ValueError as error:
+                    await self.reply(writer, {'id': None, 'error': f'Invalid job: {error}'})
+                    continue
+                result = asyncio.get_running_loop().create_future()
+                await self.jobs.put((job, result))
+                reply = asyncio.create_task(self.reply_when_done(writer, job.get('id'), result))
+                replies.add(reply)
+                reply.add_done_callback(replies.discard)
+            await asyncio.gather(*replies)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def reply_when_done(self, writer, job_id, result):
+        await self.reply(writer, dict(await result, id=job_id))
+
+    @staticmethod
+    async def reply(writer, message):
+        writer.write(json.dumps(message).encode() + b'\n')
+        await writer.drain()
+
+    # a job is batched if its engine is cheap (see batched_engines) and its roll has up to small_roll_size units
+    # an invalid job is batched, its worker sends the error back at once
+    def is_batched(self, job):
+        engine = job.get('engine', 'greedy')
+        if engine not in engines:
+            return True
+        try:
+            if engine == 'bogo' and int(job.get('options', {}).get('max_iter', 500)) > batched_bogo_iter:
+                return False
+            return engine in batched_engines and int(job.get('roll_size', 500)) <= self.small_roll_size
+        except (AttributeError, TypeError, ValueError):
+            return True
+
+    # takes the jobs from the queue, and sends them to the pool by batches
+    async def batch_jobs(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.jobs.get()]
+            if self.is_batched(batch[0][0]):
+                end = loop.time() + self.batch_delay
+                while len(batch) < self.batch_size and (timeout := end - loop.time()) > 0:
+                    try:
+                        job = await asyncio.wait_for(self.jobs.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                    if self.is_batched(job[0]):
+                        batch.append(job)
+                    else:
+                        await self.submit([job])
+            await self.submit(batch)
+
+    # sends a batch to the pool, once there is room for it
+    async def submit(self, batch):
+        await self.batches.acquire()
+        future = asyncio.get_running_loop().run_in_executor(self.pool, solve_jobs, [job for job, _ in batch])
+        future.add_done_callback(lambda done: self.dispatch(batch, done))
+
+    def dispatch(self, batch, done):
+        self.batches.release()
+        if done.exception() is not None:
+            results = [{'error': f'{done.exception().__class__.__name__}: {done.exception()}'}] * len(batch)
+        else:
+            results = done.result()
+        for (_, result), job_result in zip(batch, results):
+            if not result.done():
+                result.set_result(job_result)
+
+
+def serve(socket_path=None, **options):
+    asyncio.run(SolverServer(socket_path, **options).serve())
+
+
+# client of the service: sends the jobs on one connection, and returns their results in the order of the jobs
+# the jobs are dicts (see solve_job), their ids are set to their index
+def request(jobs, socket_path=None):
+    jobs = [dict(job, id=i) for i, job in enumerate(jobs)]
+    results = [None] * len(jobs)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(DEFAULT_SOCKET_PATH if socket_path is None else socket_path)
+        connection.sendall(b''.join(json.dumps(job).encode() + b'\n' for job in jobs))
+        connection.shutdown(socket.SHUT_WR)
+        with connection.makefile('r') as replies:
+            for line in replies:
+                result = json.loads(line)
+                results[result['id']] = result
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Solver service of the biscuit engines on a Unix socket')
+    parser.add_argument('--socket', default=None, help=f'path of the socket, by default {DEFAULT_SOCKET_PATH}')
+    parser.add_argument('--processes', type=int, default=None, help='number of worker processes')
+    parser.add_argument('--batch-size', type=int, default=32, help='most jobs on small rolls in a batch')
+    parser.add_argument('--max-pending', type=int, default=256, help='most jobs waiting for a worker')
+    args = parser.parse_args()
+    serve(args.socket, n_processes=args.processes, batch_size=args.batch_size, max_pending=args.max_pending)